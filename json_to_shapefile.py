@@ -8,6 +8,8 @@ with attribute fields for all node properties.
 
 Requirements:
     pip install pyshp
+    pip install orjson    # optional, faster JSON parsing
+    pip install ijson     # optional, streams nodes instead of loading whole files
 
 Usage examples:
     # Convert a single file to its own shapefile
@@ -18,17 +20,41 @@ Usage examples:
 
     # Merge into two shapefiles split by direction (incoming.shp + outgoing.shp)
     python json_to_shapefile.py --input_dir ./data --output_dir ./shapefiles --merge
+
+    # Batch-convert using 4 worker processes (default: one per CPU)
+    python json_to_shapefile.py --input_dir ./data --output_dir ./shapefiles --jobs 4
 """
 
 from __future__ import annotations
 
 import argparse
+import io
 import json
+import os
+import struct
 import sys
+from contextlib import contextmanager
+from functools import lru_cache, partial
+from itertools import chain
+from operator import itemgetter
 from pathlib import Path
 
 import shapefile
 
+from tomtom_common import (
+    PARSE_ERRORS, NodeStream, list_json_files, parallel_map, read_header,
+)
+
+try:
+    import ijson
+except ImportError:  # optional dependency
+    ijson = None
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
 # WGS 84 projection string — ArcGIS Pro reads the .prj sidecar file to
 # assign a coordinate system automatically.
 WGS84_PRJ = (
@@ -51,11 +77,40 @@ FIELD_DEFS = {
     "trips_pct":          ("trips_pct",   "N", 12, 4),
 }
 
+# Extra field added in --merge mode: the input file stem of each feature
+SOURCE_FIELD = ("source", "C", 80, 0)
+
+# Buffer size for the .shp/.shx/.dbf handles.  pyshp issues several small
+# writes per feature; a large buffer coalesces them into few syscalls.
+WRITE_BUFFER_SIZE = 1 << 20
+
+# Merged outputs can reach gigabytes, so they get a larger buffer.  Not
+# used per-file: allocating it for each small shapefile costs more than
+# the syscalls it saves.
+MERGE_BUFFER_SIZE = 4 << 20
+
 
 def read_json(path: Path) -> dict:
-    """Read and parse a JSON file with UTF-8 encoding."""
-    with open(path, encoding="utf-8") as f:
-        return json.load(f)
+    """Read and parse a JSON file with UTF-8 encoding.
+
+    Uses orjson on the raw bytes when available, stdlib json otherwise.
+    """
+    data = path.read_bytes()
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data.decode("utf-8"))
+
+
+def load_doc(path: Path) -> object:
+    """Load a file for conversion.
+
+    With ijson installed, only the header is built up front (after a
+    syntax check of the whole file) and 'nodes' is streamed from disk
+    during conversion; otherwise the file is read whole.
+    """
+    if ijson is not None:
+        return read_header(path)
+    return read_json(path)
 
 
 def validate_doc(doc: dict, path: Path) -> str | None:
@@ -66,13 +121,23 @@ def validate_doc(doc: dict, path: Path) -> str | None:
         return f"{path}: missing required key 'nodeFormat'"
     if "nodes" not in doc:
         return f"{path}: missing required key 'nodes'"
-    if not isinstance(doc["nodeFormat"], list) or not isinstance(doc["nodes"], list):
+    if (not isinstance(doc["nodeFormat"], list)
+            or not isinstance(doc["nodes"], (list, NodeStream))):
         return f"{path}: 'nodeFormat' and 'nodes' must be arrays"
     return None
 
 
 def find_field_indices(node_format: list[str]) -> dict[str, int]:
-    """Map lowercase field names to their index in the node array."""
+    """Map lowercase field names to their index in the node array.
+
+    Results are cached per distinct nodeFormat (TomTom files all share one),
+    so the returned dict must not be mutated.
+    """
+    return _field_indices(tuple(node_format))
+
+
+@lru_cache(maxsize=16)
+def _field_indices(node_format: tuple[str, ...]) -> dict[str, int]:
     return {name.lower(): i for i, name in enumerate(node_format)}
 
 
@@ -87,6 +152,52 @@ def _detect_attr_fields(field_map: dict[str, int]) -> list[tuple[str, int, tuple
     return attr_fields
 
 
+@lru_cache(maxsize=16)
+def _doc_schema(
+    node_format: tuple[str, ...],
+) -> tuple[int | None, list[tuple[str, int, tuple]]]:
+    """Return (geometry index, attribute fields) for a nodeFormat, cached."""
+    field_map = find_field_indices(node_format)
+    return field_map.get("geometry"), _detect_attr_fields(field_map)
+
+
+@lru_cache(maxsize=16)
+def _attr_indices(
+    node_format: tuple[str, ...], attr_names: tuple[str, ...]
+) -> tuple[int | None, ...]:
+    """Index of each target attribute in nodes of this format (None if absent)."""
+    field_map = find_field_indices(node_format)
+    return tuple(field_map.get(lname) for lname in attr_names)
+
+
+@lru_cache(maxsize=16)
+def _record_getter(indices: tuple[int | None, ...]):
+    """Return a callable mapping a node to its attribute values as a tuple.
+
+    When every index is present this is a single C-level itemgetter;
+    attributes missing from the doc (index None) come back as None.
+    """
+    if None in indices:
+        return lambda node: tuple(None if i is None else node[i] for i in indices)
+    if not indices:
+        return lambda node: ()
+    if len(indices) == 1:
+        (i,) = indices
+        return lambda node: (node[i],)
+    return itemgetter(*indices)
+
+
+@lru_cache(maxsize=16)
+def _append_plan(node_format: tuple[str, ...], attr_names: tuple[str, ...]):
+    """Return (geometry index, record getter) for appending docs of a format.
+
+    TomTom exports share one nodeFormat, so in merged mode every file after
+    the first is a single cache hit here.
+    """
+    geom_idx = find_field_indices(node_format).get("geometry")
+    return geom_idx, _record_getter(_attr_indices(node_format, attr_names))
+
+
 def _write_prj(output_path: Path) -> None:
     """Write WGS 84 .prj sidecar."""
     prj_path = output_path.with_suffix(".prj")
@@ -103,17 +214,151 @@ def _detect_direction(filename: str) -> str:
     return "unknown"
 
 
-def _create_writer(output_path: Path, attr_fields, with_source: bool):
-    """Create a shapefile Writer with the standard field schema."""
+class PolylineWriter:
+    """Shapefile writer specialised for 2-D PolyLine features.
+
+    pyshp builds a Shape object, a BytesIO buffer and several bounding-box
+    tuples for every feature, which dominates conversion time.  Here each
+    record is packed with a single struct call and written straight to the
+    .shp and .shx streams; attributes still go through a pyshp Writer on
+    the .dbf.  The bytes match what shapefile.Writer produces.
+    """
+
+    def __init__(self, shp, shx, dbf) -> None:
+        self.shp = shp
+        self.shx = shx
+        self.dbf_file = dbf
+        self.dbf = shapefile.Writer(dbf=dbf)
+        self.fields: list[tuple[tuple, dict]] = []
+        self.shp_num = 0
+        self.rec_num = 0  # records written without error
+        self.offset = 100  # .shp header size
+        self.bbox: list[float] | None = None
+        shp.write(bytes(100))  # headers are filled in by close()
+        shx.write(bytes(100))
+
+    def field(self, *args, **kwargs) -> None:
+        self.dbf.field(*args, **kwargs)
+        self.fields.append((args, kwargs))
+
+    def record(self, *values) -> None:
+        try:
+            self.dbf.record(*values)
+        except Exception:
+            # Keep .shp and .dbf in step, as pyshp's autoBalance would.
+            if self.rec_num < self.shp_num:
+                self._pad_record()
+            raise
+        self.rec_num += 1
+
+    def _pad_record(self) -> None:
+        """Stand in a null record for one whose dbf.record() call failed.
+
+        pyshp 3.x builds a record in memory before writing it, so nothing
+        reached the .dbf.  pyshp 2.x has already counted the record and may
+        have written part of it; that slot is overwritten with null values.
+        """
+        if len(self.dbf) == self.rec_num:
+            self.dbf.record()
+        else:
+            header_len, null = self._null_record()
+            self.dbf_file.seek(header_len + self.rec_num * len(null))
+            self.dbf_file.write(null)
+            self.dbf_file.truncate()
+        self.rec_num += 1
+
+    def _null_record(self) -> tuple[int, bytes]:
+        """(header length, null record bytes) for this writer's fields."""
+        buf = io.BytesIO()
+        scratch = shapefile.Writer(dbf=buf)
+        for args, kwargs in self.fields:
+            scratch.field(*args, **kwargs)
+        scratch.record()
+        scratch.close()
+        data = buf.getvalue()
+        header_len, record_len = struct.unpack_from("<2H", data, 8)
+        return header_len, data[header_len:header_len + record_len]
+
+    def polyline(self, coords: list) -> None:
+        """Write one single-part polyline from a list of [x, y] pairs."""
+        n = len(coords)
+        flat = list(chain.from_iterable(coords))
+        if len(flat) != 2 * n:  # points with Z/M values: keep x, y only
+            flat = [v for point in coords for v in point[:2]]
+        xs = flat[0::2]
+        ys = flat[1::2]
+        xmin, ymin, xmax, ymax = min(xs), min(ys), max(xs), max(ys)
+
+        # Content: shape type, box, numParts, numPoints, parts[0], points
+        content_len = 48 + 16 * n
+        # Pack the whole record before writing so a bad point leaves no trace.
+        record = struct.pack(
+            ">2i", self.shp_num + 1, content_len // 2,
+        ) + struct.pack(
+            f"<i4d3i{2 * n}d",
+            shapefile.POLYLINE, xmin, ymin, xmax, ymax, 1, n, 0, *flat,
+        )
+        self.shp.write(record)
+        self.shp_num += 1
+        self.shx.write(struct.pack(">2i", self.offset // 2, content_len // 2))
+        self.offset += 8 + content_len
+
+        bbox = self.bbox
+        if bbox is None:
+            self.bbox = [xmin, ymin, xmax, ymax]
+        else:
+            bbox[0] = min(bbox[0], xmin)
+            bbox[1] = min(bbox[1], ymin)
+            bbox[2] = max(bbox[2], xmax)
+            bbox[3] = max(bbox[3], ymax)
+
+    def _header(self, file_length: int) -> bytes:
+        return (
+            struct.pack(">7i", 9994, 0, 0, 0, 0, 0, file_length // 2)
+            + struct.pack("<2i", 1000, shapefile.POLYLINE)
+            + struct.pack("<8d", *(self.bbox or (0, 0, 0, 0)), 0, 0, 0, 0)
+        )
+
+    def close(self) -> None:
+        self.dbf.close()
+        for f, length in ((self.shp, self.offset), (self.shx, 100 + 8 * self.shp_num)):
+            f.seek(0)
+            f.write(self._header(length))
+
+
+@contextmanager
+def _open_writer(
+    output_path: Path,
+    attr_fields,
+    with_source: bool,
+    buffer_size: int = WRITE_BUFFER_SIZE,
+):
+    """Open a PolylineWriter with the standard field schema.
+
+    The .shp/.shx/.dbf files are opened here with buffer_size-byte
+    buffers; the writer and all three files are closed on exit.
+    """
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    w = shapefile.Writer(str(output_path))
-    w.shapeType = shapefile.POLYLINE
-    w.autoBalance = 1
-    for _, _, (fname, ftype, fsize, fdec) in attr_fields:
-        w.field(fname, ftype, size=fsize, decimal=fdec)
-    if with_source:
-        w.field("source", "C", size=80)
-    return w
+    handles = []
+    try:
+        for ext in (".shp", ".shx", ".dbf"):
+            handles.append(
+                open(output_path.with_suffix(ext), "w+b", buffering=buffer_size)
+            )
+        w = PolylineWriter(*handles)
+        try:
+            # FIELD_DEFS entries are already in Writer.field's positional
+            # order (name, type, size, decimal), so pass them straight through.
+            for _, _, field_def in attr_fields:
+                w.field(*field_def)
+            if with_source:
+                w.field(*SOURCE_FIELD)
+            yield w
+        finally:
+            w.close()
+    finally:
+        for f in handles:
+            f.close()
 
 
 def convert_to_shapefile(doc: dict, output_path: Path) -> int:
@@ -121,29 +366,27 @@ def convert_to_shapefile(doc: dict, output_path: Path) -> int:
 
     Returns number of features written.
     """
-    field_map = find_field_indices(doc["nodeFormat"])
-    geom_idx = field_map.get("geometry")
-    attr_fields = _detect_attr_fields(field_map)
-
-    w = _create_writer(output_path, attr_fields, with_source=False)
+    geom_idx, attr_fields = _doc_schema(tuple(doc["nodeFormat"]))
+    get_attrs = _record_getter(tuple(idx for _, idx, _ in attr_fields))
 
     count = 0
-    for node in doc["nodes"]:
-        coords = node[geom_idx] if geom_idx is not None else None
-        if not coords or not isinstance(coords, list) or len(coords) < 2:
-            continue
-        w.line([coords])
-        rec = [node[idx] if node[idx] is not None else None for _, idx, _ in attr_fields]
-        w.record(*rec)
-        count += 1
+    with _open_writer(output_path, attr_fields, with_source=False) as w:
+        for node in doc["nodes"]:
+            coords = node[geom_idx] if geom_idx is not None else None
+            # Exact type test: nodes are not inspected by validate_doc (they
+            # may be streamed), so non-array geometry must still be skipped.
+            if coords.__class__ is not list or len(coords) < 2:
+                continue
+            w.polyline(coords)
+            w.record(*get_attrs(node))
+            count += 1
 
-    w.close()
     _write_prj(output_path)
     return count
 
 
 def append_to_writer(
-    w: shapefile.Writer,
+    w: PolylineWriter,
     doc: dict,
     source_name: str,
     attr_fields: list[tuple[str, int, tuple]],
@@ -152,34 +395,45 @@ def append_to_writer(
 
     Returns number of features appended.
     """
-    field_map = find_field_indices(doc["nodeFormat"])
-    geom_idx = field_map.get("geometry")
-
-    doc_indices = {}
-    for lname, _target_idx, _ in attr_fields:
-        doc_indices[lname] = field_map.get(lname)
+    geom_idx, get_attrs = _append_plan(
+        tuple(doc["nodeFormat"]), tuple(lname for lname, _, _ in attr_fields)
+    )
 
     count = 0
     for node in doc["nodes"]:
         coords = node[geom_idx] if geom_idx is not None else None
-        if not coords or not isinstance(coords, list) or len(coords) < 2:
+        if coords.__class__ is not list or len(coords) < 2:
             continue
-        w.line([coords])
-        rec = []
-        for lname, _, _ in attr_fields:
-            idx = doc_indices.get(lname)
-            if idx is not None:
-                val = node[idx]
-                rec.append(val if val is not None else None)
-            else:
-                rec.append(None)
-        rec.append(source_name)
-        w.record(*rec)
+        w.polyline(coords)
+        w.record(*get_attrs(node), source_name)
         count += 1
 
     return count
 
 
+def _convert_one(filepath: Path, output_dir: Path) -> tuple[int, str | None]:
+    """Read, validate and convert one file to output_dir/stem/stem.shp.
+
+    Returns (feature_count, error_message).  Runs in worker processes, so
+    failures are returned rather than printed.
+    """
+    try:
+        doc = load_doc(filepath)
+    except PARSE_ERRORS as exc:
+        return 0, f"{filepath}: failed to read — {exc}"
+
+    err = validate_doc(doc, filepath)
+    if err is not None:
+        return 0, err
+
+    stem = filepath.stem
+    try:
+        count = convert_to_shapefile(doc, output_dir / stem / stem)
+    except Exception as exc:
+        return 0, f"{filepath}: conversion failed — {exc}"
+    return count, None
+
+
 def main(argv: list[str] | None = None) -> int:
     parser = argparse.ArgumentParser(
         description="Convert TomTom JSON node files to ESRI Shapefiles."
@@ -201,8 +455,16 @@ def main(argv: list[str] | None = None) -> int:
         "--merge", action="store_true",
         help="Merge files into separate incoming.shp and outgoing.shp shapefiles.",
     )
+    parser.add_argument(
+        "--jobs", type=int, default=os.cpu_count() or 1,
+        help="Worker processes for per-file mode (default: CPU count). "
+             "--merge always runs in a single process.",
+    )
     args = parser.parse_args(argv)
 
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1.")
+
     # Collect input files
     if args.input_file:
         if not args.input_file.is_file():
@@ -213,7 +475,7 @@ def main(argv: list[str] | None = None) -> int:
         if not args.input_dir.is_dir():
             print(f"Error: directory not found: {args.input_dir}", file=sys.stderr)
             return 1
-        json_files = sorted(args.input_dir.glob("*.json"))
+        json_files = list_json_files(args.input_dir)
         if not json_files:
             print(f"Warning: no *.json files in {args.input_dir}", file=sys.stderr)
             return 0
@@ -223,15 +485,18 @@ def main(argv: list[str] | None = None) -> int:
 
     if args.merge:
         # ── Merged mode: one shapefile per direction ──
-        # Peek at the first valid file to determine fields
+        # Peek at the first valid file to determine fields.  The loaded doc
+        # is kept so the conversion loop below does not parse it again.
         first_doc = None
+        first_path = None
         for filepath in json_files:
             try:
-                doc = read_json(filepath)
-            except (json.JSONDecodeError, OSError):
+                doc = load_doc(filepath)
+            except PARSE_ERRORS:
                 continue
             if validate_doc(doc, filepath) is None:
                 first_doc = doc
+                first_path = filepath
                 break
 
         if first_doc is None:
@@ -250,36 +515,40 @@ def main(argv: list[str] | None = None) -> int:
         # Process each direction into its own shapefile
         for direction, files in sorted(buckets.items()):
             output_path = args.output_dir / direction
-            w = _create_writer(output_path, attr_fields, with_source=True)
             dir_features = 0
+            with _open_writer(
+                output_path, attr_fields, with_source=True,
+                buffer_size=MERGE_BUFFER_SIZE,
+            ) as w:
+                for filepath in files:
+                    if filepath == first_path:
+                        doc = first_doc
+                    else:
+                        try:
+                            doc = load_doc(filepath)
+                        except PARSE_ERRORS as exc:
+                            msg = f"{filepath}: failed to read — {exc}"
+                            failures.append(msg)
+                            print(msg, file=sys.stderr)
+                            continue
+
+                        err = validate_doc(doc, filepath)
+                        if err is not None:
+                            failures.append(err)
+                            print(err, file=sys.stderr)
+                            continue
+
+                    try:
+                        count = append_to_writer(w, doc, filepath.stem, attr_fields)
+                    except Exception as exc:
+                        msg = f"{filepath}: conversion failed — {exc}"
+                        failures.append(msg)
+                        print(msg, file=sys.stderr)
+                        continue
+
+                    dir_features += count
+                    print(f"{filepath.name}: {count} features", file=sys.stderr)
 
-            for filepath in files:
-                try:
-                    doc = read_json(filepath)
-                except (json.JSONDecodeError, OSError) as exc:
-                    msg = f"{filepath}: failed to read — {exc}"
-                    failures.append(msg)
-                    print(msg, file=sys.stderr)
-                    continue
-
-                err = validate_doc(doc, filepath)
-                if err is not None:
-                    failures.append(err)
-                    print(err, file=sys.stderr)
-                    continue
-
-                try:
-                    count = append_to_writer(w, doc, filepath.stem, attr_fields)
-                except Exception as exc:
-                    msg = f"{filepath}: conversion failed — {exc}"
-                    failures.append(msg)
-                    print(msg, file=sys.stderr)
-                    continue
-
-                dir_features += count
-                print(f"{filepath.name}: {count} features", file=sys.stderr)
-
-            w.close()
             _write_prj(output_path)
             total_features += dir_features
             print(
@@ -297,32 +566,17 @@ def main(argv: list[str] | None = None) -> int:
 
     else:
         # ── Per-file mode: one shapefile per JSON file ──
-        for filepath in json_files:
-            try:
-                doc = read_json(filepath)
-            except (json.JSONDecodeError, OSError) as exc:
-                msg = f"{filepath}: failed to read — {exc}"
-                failures.append(msg)
-                print(msg, file=sys.stderr)
-                continue
-
-            err = validate_doc(doc, filepath)
+        # Each output is independent, so files are converted in parallel.
+        convert = partial(_convert_one, output_dir=args.output_dir)
+        results = parallel_map(convert, json_files, args.jobs)
+        for filepath, (count, err) in zip(json_files, results):
             if err is not None:
                 failures.append(err)
                 print(err, file=sys.stderr)
                 continue
 
-            stem = filepath.stem
-            output_path = args.output_dir / stem / stem
-            try:
-                count = convert_to_shapefile(doc, output_path)
-            except Exception as exc:
-                msg = f"{filepath}: conversion failed — {exc}"
-                failures.append(msg)
-                print(msg, file=sys.stderr)
-                continue
-
             total_features += count
+            output_path = args.output_dir / filepath.stem / filepath.stem
             print(f"{filepath.name}: {count} features -> {output_path}.shp", file=sys.stderr)
 
         total = len(json_files)
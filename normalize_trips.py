@@ -15,6 +15,17 @@ Usage examples:
 
     # Combine flags
     python normalize_trips.py --input_dir ./data --inplace --round 0 --pretty
+
+    # Use 4 worker processes (default: one per CPU)
+    python normalize_trips.py --input_dir ./in --output_dir ./out --jobs 4
+
+Optional:
+    pip install orjson    # faster JSON read/write; falls back to stdlib json
+    pip install numpy     # vectorized trips_pct; falls back to pure Python
+
+With orjson, output matches the stdlib layout but is not byte-identical
+for every value: some floats are spelled differently (0.00001 vs 1e-05,
+1e16 vs 1e+16) and NaN/Infinity become null rather than NaN/Infinity.
 """
 
 from __future__ import annotations
@@ -23,13 +34,41 @@ import argparse
 import json
 import os
 import sys
+from collections import deque
+from functools import partial
+from operator import itemgetter
 from pathlib import Path
 
+from tomtom_common import list_json_files, parallel_map
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+# Required nodeFormat, compared case-insensitively
+EXPECTED_FIELDS = ("id", "parentid", "trips", "frc", "geometry",
+                   "processingfailures", "privacytrims")
+
+# Largest --round handled by the vectorized NumPy path: pct * 10**n stays
+# well below 2**53, so rint() of it is exact.
+MAX_VECTOR_ROUND = 8
+
 
 def read_json(path: Path) -> dict:
-    """Read and parse a JSON file with UTF-8 encoding."""
-    with open(path, encoding="utf-8") as f:
-        return json.load(f)
+    """Read and parse a JSON file with UTF-8 encoding.
+
+    Uses orjson on the raw bytes when available, stdlib json otherwise.
+    """
+    data = path.read_bytes()
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data.decode("utf-8"))
 
 
 def validate_doc(doc: dict, path: Path) -> str | None:
@@ -49,20 +88,30 @@ def validate_doc(doc: dict, path: Path) -> str | None:
     if not isinstance(node_format, list):
         return f"{path}: 'nodeFormat' is not an array"
 
-    lower_fields = [f.lower() if isinstance(f, str) else f for f in node_format]
-    expected = ["id", "parentid", "trips", "frc", "geometry",
-                "processingfailures", "privacytrims"]
-    if lower_fields != expected:
+    lower_fields = tuple(f.lower() if isinstance(f, str) else f for f in node_format)
+    if lower_fields != EXPECTED_FIELDS:
         return (
             f"{path}: 'nodeFormat' fields do not match expected schema. "
-            f"Got {node_format}, expected (case-insensitive) {expected}"
+            f"Got {node_format}, expected (case-insensitive) {list(EXPECTED_FIELDS)}"
         )
 
     if not isinstance(doc["nodes"], list):
         return f"{path}: 'nodes' is not an array"
 
+    nodes = doc["nodes"]
     expected_len = len(node_format)
-    for i, node in enumerate(doc["nodes"]):
+
+    # Fast path: every node is checked (process_doc indexes all of them, so
+    # sampling is not safe), but with an exact-type test and no enumerate.
+    # Only on a mismatch does the loop below run to build the message.
+    _len = len
+    for node in nodes:
+        if node.__class__ is not list or _len(node) != expected_len:
+            break
+    else:
+        return None
+
+    for i, node in enumerate(nodes):
         if not isinstance(node, list):
             return f"{path}: node[{i}] is not an array"
         if len(node) != expected_len:
@@ -74,29 +123,78 @@ def validate_doc(doc: dict, path: Path) -> str | None:
     return None
 
 
+def _trips_pct_numpy(trips: list, round_n: int) -> list[float]:
+    """Compute trips_pct for a trips column in one vectorized pass.
+
+    None trips become NaN in the array and are mapped back to 0.0.
+    """
+    arr = np.fromiter(
+        (np.nan if val is None else val for val in trips),
+        dtype=np.float64, count=len(trips),
+    )
+    max_trips = np.fmax.reduce(arr, initial=0.0)  # fmax skips NaN
+    if max_trips == 0:
+        return [0.0] * len(trips)
+    # Same operation order as the scalar path, so pct matches it exactly.
+    pct = arr / max_trips * 100
+    pct[np.isnan(pct)] = 0.0
+    _round = round
+    if not 0 <= round_n <= MAX_VECTOR_ROUND:
+        return [_round(val, round_n) for val in pct.tolist()]
+
+    # rint(pct * 10**n) / 10**n equals round(pct, n) unless pct * 10**n
+    # lies within its own rounding error of a .5 boundary, where it can
+    # land on the wrong side.  Those few values are rounded again with
+    # Python's correctly rounded round().
+    scale = 10.0 ** round_n
+    scaled = pct * scale
+    result = (np.rint(scaled) / scale).tolist()
+    tie_gap = np.abs(scaled - np.floor(scaled) - 0.5)
+    for i in np.flatnonzero(tie_gap <= np.abs(scaled) * 1e-12 + 1e-12).tolist():
+        result[i] = _round(pct[i].item(), round_n)
+    return result
+
+
+def _trips_pct_python(trips: list, round_n: int) -> list[float]:
+    """Compute trips_pct for a trips column with plain Python loops."""
+    # Find max_trips, ignoring None/null values
+    max_trips = 0
+    for val in trips:
+        if val is not None and val > max_trips:
+            max_trips = val
+
+    if max_trips == 0:
+        return [0.0] * len(trips)
+
+    _round = round  # local binding, looked up once per value
+    return [
+        0.0 if val is None else _round(val / max_trips * 100, round_n)
+        for val in trips
+    ]
+
+
 def process_doc(doc: dict, round_n: int) -> dict:
     """Add trips_pct to nodeFormat and every node array.
 
     Computes trips_pct = (trips / max_trips) * 100, rounded to round_n
     decimal places.  Returns a new dict (shallow copy of top-level keys,
-    nodes are mutated in place for efficiency).
+    nodes are mutated in place for efficiency).  Uses NumPy when it is
+    installed, a pure-Python loop otherwise.
     """
     trips_index = 2  # "trips" is always the 3rd field
+    nodes = doc["nodes"]
 
-    # Find max_trips, ignoring None/null values
-    max_trips = 0
-    for node in doc["nodes"]:
-        val = node[trips_index]
-        if val is not None and val > max_trips:
-            max_trips = val
+    # Read the trips column in a single C-level pass; both the max scan and
+    # the percentages then work on this flat list instead of the nodes.
+    trips = list(map(itemgetter(trips_index), nodes))
+    if np is not None:
+        pct = _trips_pct_numpy(trips, round_n)
+    else:
+        pct = _trips_pct_python(trips, round_n)
 
-    # Compute trips_pct for each node
-    for node in doc["nodes"]:
-        val = node[trips_index]
-        if val is None or max_trips == 0:
-            node.append(0.0)
-        else:
-            node.append(round((val / max_trips) * 100, round_n))
+    # Append each value in place via C-level map(); the zero-length deque
+    # just drains the iterator.
+    deque(map(list.append, nodes, pct), maxlen=0)
 
     # Append the new field name to nodeFormat
     doc["nodeFormat"] = doc["nodeFormat"] + ["trips_pct"]
@@ -104,15 +202,58 @@ def process_doc(doc: dict, round_n: int) -> dict:
     return doc
 
 
+# Built once and reused: encode() (unlike json.dump/iterencode) takes the
+# C encoder fast path when indent is None.
+_COMPACT_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+_PRETTY_ENCODER = json.JSONEncoder(ensure_ascii=False, indent=2)
+
+
 def write_json(path: Path, doc: dict, pretty: bool = False) -> None:
-    """Write a dict as JSON with UTF-8 encoding."""
+    """Write a dict as JSON with UTF-8 encoding.
+
+    orjson and stdlib output differ in float spelling and NaN handling;
+    see the module docstring.
+    """
     path.parent.mkdir(parents=True, exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
+    if orjson is not None:
+        option = orjson.OPT_APPEND_NEWLINE
         if pretty:
-            json.dump(doc, f, ensure_ascii=False, indent=2)
-        else:
-            json.dump(doc, f, ensure_ascii=False, separators=(",", ":"))
-        f.write("\n")
+            option |= orjson.OPT_INDENT_2
+        path.write_bytes(orjson.dumps(doc, option=option))
+        return
+    encoder = _PRETTY_ENCODER if pretty else _COMPACT_ENCODER
+    path.write_bytes((encoder.encode(doc) + "\n").encode("utf-8"))
+
+
+def _process_one(
+    filepath: Path,
+    output_dir: Path | None,
+    round_n: int,
+    pretty: bool,
+) -> str | None:
+    """Read, validate, normalize and write one file.
+
+    Writes to output_dir/<name>, or back to filepath when output_dir is
+    None (--inplace).  Returns an error message or None.  Runs in worker
+    processes, so failures are returned rather than printed.
+    """
+    try:
+        doc = read_json(filepath)
+    except (json.JSONDecodeError, OSError) as exc:
+        return f"{filepath}: failed to read/parse — {exc}"
+
+    err = validate_doc(doc, filepath)
+    if err is not None:
+        return err
+
+    process_doc(doc, round_n)
+
+    out_path = filepath if output_dir is None else output_dir / filepath.name
+    try:
+        write_json(out_path, doc, pretty=pretty)
+    except OSError as exc:
+        return f"{out_path}: failed to write — {exc}"
+    return None
 
 
 def main(argv: list[str] | None = None) -> int:
@@ -139,6 +280,10 @@ def main(argv: list[str] | None = None) -> int:
         "--pretty", action="store_true",
         help="Pretty-print output JSON (default: compact).",
     )
+    parser.add_argument(
+        "--jobs", type=int, default=os.cpu_count() or 1,
+        help="Worker processes (default: CPU count).",
+    )
     args = parser.parse_args(argv)
 
     # Validate argument combinations
@@ -146,13 +291,15 @@ def main(argv: list[str] | None = None) -> int:
         parser.error("Provide --output_dir or --inplace.")
     if args.inplace and args.output_dir is not None:
         parser.error("--inplace and --output_dir are mutually exclusive.")
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1.")
 
     input_dir: Path = args.input_dir
     if not input_dir.is_dir():
         print(f"Error: input directory does not exist: {input_dir}", file=sys.stderr)
         return 1
 
-    json_files = sorted(input_dir.glob("*.json"))
+    json_files = list_json_files(input_dir)
     if not json_files:
         print(f"Warning: no *.json files found in {input_dir}", file=sys.stderr)
         return 0
@@ -160,40 +307,16 @@ def main(argv: list[str] | None = None) -> int:
     failures: list[str] = []
     processed = 0
 
-    for filepath in json_files:
-        # Read
-        try:
-            doc = read_json(filepath)
-        except (json.JSONDecodeError, OSError) as exc:
-            msg = f"{filepath}: failed to read/parse — {exc}"
-            failures.append(msg)
-            print(msg, file=sys.stderr)
-            continue
-
-        # Validate
-        err = validate_doc(doc, filepath)
+    # Files are independent, so they are normalized in parallel.
+    output_dir = None if args.inplace else args.output_dir
+    worker = partial(
+        _process_one, output_dir=output_dir, round_n=args.round_n, pretty=args.pretty
+    )
+    for err in parallel_map(worker, json_files, args.jobs):
         if err is not None:
             failures.append(err)
             print(err, file=sys.stderr)
             continue
-
-        # Process
-        process_doc(doc, args.round_n)
-
-        # Write
-        if args.inplace:
-            out_path = filepath
-        else:
-            out_path = args.output_dir / filepath.name
-
-        try:
-            write_json(out_path, doc, pretty=args.pretty)
-        except OSError as exc:
-            msg = f"{out_path}: failed to write — {exc}"
-            failures.append(msg)
-            print(msg, file=sys.stderr)
-            continue
-
         processed += 1
 
     # Summary
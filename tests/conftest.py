@@ -1,11 +1,30 @@
-"""Shared fixtures for TomTom pipeline tests."""
+"""Shared fixtures for TomTom pipeline tests.
+
+The document fixtures are session-scoped and shared: tests that mutate a
+doc (e.g. via process_doc) must work on a copy.deepcopy of it.
+
+Every test works in its own directory.  read_shapefile caches parsed
+output per process, keyed on path and .shp mtime, so a rewritten file is
+read afresh.  The suite can run in parallel with pytest-xdist
+(pip install pytest-xdist):
+
+    python -m pytest -n auto --dist=loadfile tests/
+"""
 
 from __future__ import annotations
 
 import json
+import struct
+from functools import cached_property, lru_cache
 from pathlib import Path
 
 import pytest
+import shapefile
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
 
 
 def _make_node(
@@ -32,7 +51,7 @@ SAMPLE_COORDS_B = [[8.12300, 47.40000], [8.12310, 47.40010]]
 SAMPLE_COORDS_C = [[8.50000, 47.30000], [8.50010, 47.30010], [8.50020, 47.30020]]
 
 
-@pytest.fixture()
+@pytest.fixture(scope="session")
 def sample_doc() -> dict:
     """A valid TomTom JSON document with 3 nodes."""
     return {
@@ -45,7 +64,7 @@ def sample_doc() -> dict:
     }
 
 
-@pytest.fixture()
+@pytest.fixture(scope="session")
 def sample_doc_with_nulls() -> dict:
     """A valid doc where some trips values are None."""
     return {
@@ -58,7 +77,7 @@ def sample_doc_with_nulls() -> dict:
     }
 
 
-@pytest.fixture()
+@pytest.fixture(scope="session")
 def sample_doc_all_zero() -> dict:
     """A valid doc where all trips values are 0."""
     return {
@@ -70,7 +89,7 @@ def sample_doc_all_zero() -> dict:
     }
 
 
-@pytest.fixture()
+@pytest.fixture(scope="session")
 def normalized_doc() -> dict:
     """A doc that already has trips_pct (simulating normalize output)."""
     fmt = list(STANDARD_NODE_FORMAT) + ["trips_pct"]
@@ -84,9 +103,122 @@ def normalized_doc() -> dict:
     }
 
 
+@pytest.fixture(scope="class")
+def base_dirs(tmp_path_factory) -> tuple[Path, Path]:
+    """Input and output parent directories shared by one test class."""
+    return tmp_path_factory.mktemp("in"), tmp_path_factory.mktemp("out")
+
+
+@pytest.fixture()
+def case_dirs(base_dirs, request) -> tuple[Path, Path]:
+    """(input_dir, output_dir) for one test, under the class's base_dirs.
+
+    Neither is created here: write_json_file and the scripts make them on
+    demand, so a test that needs no input directory costs no mkdir.
+    """
+    in_base, out_base = base_dirs
+    return in_base / request.node.name, out_base / request.node.name
+
+
 def write_json_file(path: Path, doc: dict) -> Path:
-    """Helper: write a doc as JSON and return the path."""
+    """Helper: write a doc as UTF-8 JSON (via orjson if installed) and return the path."""
     path.parent.mkdir(parents=True, exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(doc, f, ensure_ascii=False)
+    if orjson is not None:
+        path.write_bytes(orjson.dumps(doc))
+    else:
+        path.write_text(json.dumps(doc, ensure_ascii=False), encoding="utf-8")
     return path
+
+
+def read_json_file(path: Path) -> dict:
+    """Helper: parse a JSON file written by the scripts under test."""
+    data = path.read_bytes()
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data.decode("utf-8"))
+
+
+# Bad-input setups for the scripts' exit-code tests; each prepares input_dir.
+
+
+def _empty_dir(input_dir: Path) -> None:
+    input_dir.mkdir(parents=True)
+
+
+def _malformed_json(input_dir: Path) -> None:
+    input_dir.mkdir(parents=True)
+    (input_dir / "bad.json").write_text("{invalid json!!")
+
+
+def _invalid_structure(input_dir: Path) -> None:
+    write_json_file(input_dir / "bad.json", {"wrong": "structure"})
+
+
+def _missing_dir(input_dir: Path) -> None:
+    pass
+
+
+class ShapefileContents:
+    """What a test reads back from a written shapefile.
+
+    The header (shape type, fields, record count) is read up front; shapes
+    and records are only decoded when a test asks for them.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with shapefile.Reader(path) as sf:
+            self.shape_type = sf.shapeType
+            self.field_names = [f[0] for f in sf.fields[1:]]  # skip DeletionFlag
+            self.num_records = len(sf)
+
+    def __len__(self) -> int:
+        return self.num_records
+
+    def record(self, i: int):
+        """Decode a single .dbf record."""
+        with shapefile.Reader(self.path) as sf:
+            return sf.record(i)
+
+    @cached_property
+    def records(self) -> list:
+        with shapefile.Reader(self.path) as sf:
+            return sf.records()
+
+    @cached_property
+    def shapes(self) -> list:
+        with shapefile.Reader(self.path) as sf:
+            return sf.shapes()
+
+
+@lru_cache(maxsize=128)
+def _read_shapefile(path: str, mtime_ns: int) -> ShapefileContents:
+    return ShapefileContents(path)
+
+
+def read_shapefile(path: Path) -> ShapefileContents:
+    """Helper: read a shapefile (with or without .shp suffix) once.
+
+    Results are cached by path and .shp mtime, so several tests asserting
+    on the same output parse it a single time.
+    """
+    shp = Path(path)
+    if shp.suffix != ".shp":
+        shp = shp.with_name(shp.name + ".shp")
+    return _read_shapefile(str(shp), shp.stat().st_mtime_ns)
+
+
+def shp_shape_types(path: Path) -> tuple[int, list[int]]:
+    """Helper: (file shape type, per-record shape types) from raw .shp bytes.
+
+    Walks the record headers directly, so type checks need no pyshp Reader.
+    """
+    data = Path(path).read_bytes()
+    (file_type,) = struct.unpack_from("<i", data, 32)
+    record_types = []
+    pos = 100
+    while pos < len(data):
+        (content_words,) = struct.unpack_from(">i", data, pos + 4)
+        record_types.append(struct.unpack_from("<i", data, pos + 8)[0])
+        pos += 8 + 2 * content_words
+    return file_type, record_types
@@ -2,7 +2,11 @@
 
 from __future__ import annotations
 
+import io
 import json
+import ntpath
+import os
+import struct
 import sys
 from pathlib import Path
 
@@ -11,43 +15,42 @@ import shapefile
 
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
+import json_to_shapefile
 from json_to_shapefile import (
     _detect_direction,
     find_field_indices,
     _detect_attr_fields,
     validate_doc,
     convert_to_shapefile,
+    _record_getter,
+    PolylineWriter,
     main,
     FIELD_DEFS,
 )
-from tests.conftest import write_json_file, STANDARD_NODE_FORMAT
+from tomtom_common import PARSE_ERRORS, NodeStream, list_json_files, read_header
+from tests.conftest import (
+    write_json_file, read_shapefile, shp_shape_types, STANDARD_NODE_FORMAT,
+    _make_node, SAMPLE_COORDS_A, SAMPLE_COORDS_B, SAMPLE_COORDS_C,
+    _empty_dir, _malformed_json, _invalid_structure, _missing_dir,
+)
 
 
 # ─── Unit tests: _detect_direction ──────────────────────────────────────
 
 
 class TestDetectDirection:
-    def test_incoming_mid(self):
-        assert _detect_direction("123_incoming_0_0.json") == "incoming"
-
-    def test_outgoing_mid(self):
-        assert _detect_direction("123_outgoing_0_0.json") == "outgoing"
-
-    def test_incoming_prefix(self):
-        assert _detect_direction("incoming_data.json") == "incoming"
-
-    def test_outgoing_prefix(self):
-        assert _detect_direction("outgoing_data.json") == "outgoing"
-
-    def test_case_insensitive(self):
-        assert _detect_direction("123_INCOMING_0.json") == "incoming"
-        assert _detect_direction("123_OUTGOING_0.json") == "outgoing"
-
-    def test_unknown(self):
-        assert _detect_direction("some_data.json") == "unknown"
-
-    def test_empty(self):
-        assert _detect_direction("") == "unknown"
+    @pytest.mark.parametrize("name, expected", [
+        ("123_incoming_0_0.json", "incoming"),
+        ("123_outgoing_0_0.json", "outgoing"),
+        ("incoming_data.json", "incoming"),   # prefix
+        ("outgoing_data.json", "outgoing"),
+        ("123_INCOMING_0.json", "incoming"),  # case-insensitive
+        ("123_OUTGOING_0.json", "outgoing"),
+        ("some_data.json", "unknown"),
+        ("", "unknown"),
+    ])
+    def test_detect_direction(self, name, expected):
+        assert _detect_direction(name) == expected
 
 
 # ─── Unit tests: find_field_indices ─────────────────────────────────────
@@ -77,6 +80,12 @@ class TestFindFieldIndices:
         assert "parentid" in result
         assert "trips" in result
 
+    def test_cached_per_format(self):
+        """Equal nodeFormat lists (list or tuple) share one cached mapping."""
+        first = find_field_indices(list(STANDARD_NODE_FORMAT))
+        assert find_field_indices(tuple(STANDARD_NODE_FORMAT)) is first
+        assert find_field_indices(["ID"]) is not first
+
 
 # ─── Unit tests: _detect_attr_fields ────────────────────────────────────
 
@@ -119,6 +128,91 @@ class TestDetectAttrFields:
             assert fdef == FIELD_DEFS[lname]
 
 
+# ─── Unit tests: _record_getter ─────────────────────────────────────────
+
+
+class TestRecordGetter:
+    NODE = [10, 11, 12, 13]
+
+    def test_multiple_indices(self):
+        assert _record_getter((0, 2, 3))(self.NODE) == (10, 12, 13)
+
+    def test_single_index_returns_tuple(self):
+        assert _record_getter((1,))(self.NODE) == (11,)
+
+    def test_no_indices(self):
+        assert _record_getter(())(self.NODE) == ()
+
+    def test_missing_index_yields_none(self):
+        assert _record_getter((0, None, 3))(self.NODE) == (10, None, 13)
+
+
+# ─── Unit tests: PolylineWriter ─────────────────────────────────────────
+
+
+def _write_lines(writer_cls, lines):
+    """Write lines with one numeric attribute; return (shp, shx, dbf) bytes."""
+    shp, shx, dbf = io.BytesIO(), io.BytesIO(), io.BytesIO()
+    if writer_cls is PolylineWriter:
+        w = PolylineWriter(shp, shx, dbf)
+        add = w.polyline
+    else:
+        w = shapefile.Writer(shp=shp, shx=shx, dbf=dbf, shapeType=shapefile.POLYLINE)
+        add = lambda coords: w.line([coords])  # noqa: E731
+    w.field("id", "N", size=10)
+    for i, coords in enumerate(lines):
+        add(coords)
+        w.record(i)
+    w.close()
+    return shp.getvalue(), shx.getvalue(), dbf.getvalue()
+
+
+class TestPolylineWriter:
+    @pytest.mark.parametrize("lines", [
+        [SAMPLE_COORDS_A, SAMPLE_COORDS_B, SAMPLE_COORDS_C],
+        [[[1, 2], [3, 4]]],                        # integer coordinates
+        [[[1.5, 2.0, 9.0], [3.0, -4.0, 8.0]]],     # extra Z values are dropped
+        [],                                        # empty shapefile
+    ])
+    def test_matches_pyshp_bytes(self, lines):
+        mine = _write_lines(PolylineWriter, lines)
+        ref = _write_lines(shapefile.Writer, lines)
+        assert mine[0] == ref[0]  # .shp
+        assert mine[1] == ref[1]  # .shx
+        assert mine[2][4:] == ref[2][4:]  # .dbf, minus the last-update date
+
+    def test_readable_by_pyshp(self):
+        shp, shx, dbf = _write_lines(PolylineWriter, [SAMPLE_COORDS_A, SAMPLE_COORDS_C])
+        sf = shapefile.Reader(shp=io.BytesIO(shp), shx=io.BytesIO(shx), dbf=io.BytesIO(dbf))
+        assert len(sf) == 2
+        assert [list(p) for p in sf.shape(1).points] == SAMPLE_COORDS_C
+        assert sf.record(1)[0] == 1
+
+    def test_bad_point_writes_nothing(self):
+        shp, shx, dbf = io.BytesIO(), io.BytesIO(), io.BytesIO()
+        w = PolylineWriter(shp, shx, dbf)
+        w.field("id", "N", size=10)
+        with pytest.raises(struct.error):
+            w.polyline([[8.0, 47.0], [8.1]])
+        assert (w.shp_num, w.offset) == (0, 100)
+        assert shp.tell() == shx.tell() == 100
+        w.close()
+
+    def test_failed_record_padded_with_null(self):
+        shp, shx, dbf = io.BytesIO(), io.BytesIO(), io.BytesIO()
+        w = PolylineWriter(shp, shx, dbf)
+        w.field("id", "N", size=10)
+        w.polyline(SAMPLE_COORDS_A)
+        with pytest.raises(TypeError):
+            w.record({"bad": 1})
+        w.polyline(SAMPLE_COORDS_C)
+        w.record(7)
+        w.close()
+        sf = shapefile.Reader(shp=shp, shx=shx, dbf=dbf)
+        assert [r[0] for r in sf.records()] == [None, 7]
+        assert len(sf.shapes()) == 2
+
+
 # ─── Unit tests: validate_doc ───────────────────────────────────────────
 
 
@@ -126,235 +220,402 @@ class TestValidateDocShapefile:
     def test_valid(self, sample_doc):
         assert validate_doc(sample_doc, Path("test.json")) is None
 
-    def test_not_a_dict(self):
-        assert validate_doc([], Path("x")) is not None
-
-    def test_missing_node_format(self):
-        assert validate_doc({"nodes": []}, Path("x")) is not None
-
-    def test_missing_nodes(self):
-        assert validate_doc({"nodeFormat": []}, Path("x")) is not None
-
-    def test_node_format_not_list(self):
-        assert validate_doc({"nodeFormat": "bad", "nodes": []}, Path("x")) is not None
-
-    def test_nodes_not_list(self):
-        fmt = list(STANDARD_NODE_FORMAT)
-        assert validate_doc({"nodeFormat": fmt, "nodes": "bad"}, Path("x")) is not None
+    @pytest.mark.parametrize("doc", [
+        pytest.param([], id="not_a_dict"),
+        pytest.param({"nodes": []}, id="missing_node_format"),
+        pytest.param({"nodeFormat": []}, id="missing_nodes"),
+        pytest.param({"nodeFormat": "bad", "nodes": []}, id="node_format_not_list"),
+        pytest.param({"nodeFormat": list(STANDARD_NODE_FORMAT), "nodes": "bad"},
+                     id="nodes_not_list"),
+    ])
+    def test_invalid(self, doc):
+        assert validate_doc(doc, Path("x")) is not None
+
+
+# ─── Unit tests: read_header (ijson streaming) ─────────────────────────
+
+
+@pytest.fixture(params=["stream", "load"])
+def node_backend(request, monkeypatch):
+    """Run a test with ijson streaming (when installed) and with whole-file loads."""
+    if request.param == "load":
+        monkeypatch.setattr(json_to_shapefile, "ijson", None)
+    elif json_to_shapefile.ijson is None:
+        pytest.skip("ijson not installed")
+    return request.param
+
+
+@pytest.mark.skipif(json_to_shapefile.ijson is None, reason="ijson not installed")
+class TestReadHeader:
+    def test_nodes_are_streamed(self, normalized_doc, tmp_path):
+        path = write_json_file(tmp_path / "data.json", normalized_doc)
+        header = read_header(path)
+        assert header["nodeFormat"] == normalized_doc["nodeFormat"]
+        assert isinstance(header["nodes"], NodeStream)
+        assert validate_doc(header, path) is None
+        # Re-iterable: each pass re-reads the file
+        assert list(header["nodes"]) == normalized_doc["nodes"]
+        assert list(header["nodes"]) == normalized_doc["nodes"]
+
+    def test_node_format_after_nodes(self, normalized_doc, tmp_path):
+        doc = {"nodes": normalized_doc["nodes"], "extra": {"a": [1, 2]},
+               "nodeFormat": normalized_doc["nodeFormat"]}
+        path = write_json_file(tmp_path / "data.json", doc)
+        header = read_header(path)
+        assert header["nodeFormat"] == normalized_doc["nodeFormat"]
+        assert header["extra"] == {"a": [1, 2]}
+        assert list(header["nodes"]) == normalized_doc["nodes"]
+
+    def test_nodes_not_an_array(self, tmp_path):
+        path = write_json_file(tmp_path / "data.json",
+                               {"nodeFormat": list(STANDARD_NODE_FORMAT), "nodes": "bad"})
+        assert validate_doc(read_header(path), path) is not None
+
+    def test_top_level_not_an_object(self, tmp_path):
+        path = write_json_file(tmp_path / "data.json", [1, 2, 3])
+        assert validate_doc(read_header(path), path) is not None
+
+    def test_malformed_raises_parse_error(self, tmp_path):
+        path = tmp_path / "bad.json"
+        path.write_text("{nope!!")
+        with pytest.raises(PARSE_ERRORS):
+            read_header(path)
+
+    @pytest.mark.parametrize("tail", [
+        pytest.param(None, id="truncated_nodes"),
+        pytest.param(b" trailing", id="trailing_garbage"),
+    ])
+    def test_syntax_error_after_header_raises(self, normalized_doc, tmp_path, tail):
+        """Errors past the header surface at load time, not mid-conversion."""
+        path = write_json_file(tmp_path / "data.json", normalized_doc)
+        data = path.read_bytes()
+        path.write_bytes(data[:-20] if tail is None else data + tail)
+        with pytest.raises(PARSE_ERRORS):
+            read_header(path)
+
+    def test_without_syntax_check_errors_surface_in_nodes(self, normalized_doc, tmp_path):
+        path = write_json_file(tmp_path / "data.json", normalized_doc)
+        path.write_bytes(path.read_bytes()[:-20])
+        header = read_header(path, check_syntax=False)
+        assert header["nodeFormat"] == normalized_doc["nodeFormat"]
+        with pytest.raises(PARSE_ERRORS):
+            list(header["nodes"])
 
 
 # ─── Integration tests: single-file conversion ─────────────────────────
 
 
+@pytest.mark.usefixtures("node_backend")
 class TestSingleFileConversion:
-    def test_basic_conversion(self, normalized_doc, tmp_path):
+    def test_basic_conversion(self, normalized_doc, case_dirs):
         """Convert a single doc → verify shapefile structure."""
-        input_dir = tmp_path / "input"
-        output_dir = tmp_path / "shapefiles"
+        input_dir, output_dir = case_dirs
         write_json_file(input_dir / "test_incoming_0_0.json", normalized_doc)
 
-        ret = main(["--input_dir", str(input_dir), "--output_dir", str(output_dir)])
+        ret = main(["--input_dir", str(input_dir), "--output_dir", str(output_dir),
+                    "--jobs", "1"])
         assert ret == 0
 
         # The per-file mode creates output_dir/stem/stem.shp
         shp_path = output_dir / "test_incoming_0_0" / "test_incoming_0_0.shp"
         assert shp_path.exists()
 
-        sf = shapefile.Reader(str(shp_path))
-        assert sf.shapeType == shapefile.POLYLINE
+        sf = read_shapefile(shp_path)
+        assert sf.shape_type == shapefile.POLYLINE
         assert len(sf) == 3
 
-        field_names = [f[0] for f in sf.fields[1:]]  # skip DeletionFlag
+        field_names = sf.field_names
         assert "id" in field_names
         assert "trips" in field_names
         assert "trips_pct" in field_names
 
-    def test_prj_file_created(self, normalized_doc, tmp_path):
-        input_dir = tmp_path / "input"
-        output_dir = tmp_path / "shapefiles"
+    def test_prj_file_created(self, normalized_doc, case_dirs):
+        input_dir, output_dir = case_dirs
         write_json_file(input_dir / "data.json", normalized_doc)
 
-        main(["--input_dir", str(input_dir), "--output_dir", str(output_dir)])
+        main(["--input_dir", str(input_dir), "--output_dir", str(output_dir),
+              "--jobs", "1"])
 
         prj_path = output_dir / "data" / "data.prj"
         assert prj_path.exists()
         text = prj_path.read_text()
         assert "WGS_1984" in text
 
-    def test_single_input_file(self, normalized_doc, tmp_path):
+    def test_single_input_file(self, normalized_doc, case_dirs):
         """--input_file mode with a single file."""
-        input_file = tmp_path / "single.json"
-        output_dir = tmp_path / "shapefiles"
+        input_dir, output_dir = case_dirs
+        input_file = input_dir / "single.json"
         write_json_file(input_file, normalized_doc)
 
-        ret = main(["--input_file", str(input_file), "--output_dir", str(output_dir)])
+        ret = main(["--input_file", str(input_file), "--output_dir", str(output_dir),
+                    "--jobs", "1"])
         assert ret == 0
 
         shp_path = output_dir / "single" / "single.shp"
         assert shp_path.exists()
-        sf = shapefile.Reader(str(shp_path))
-        assert len(sf) == 3
+        assert len(read_shapefile(shp_path)) == 3
 
-    def test_attribute_values(self, normalized_doc, tmp_path):
+    def test_attribute_values(self, normalized_doc, case_dirs):
         """Verify attribute values are correctly transferred."""
-        input_dir = tmp_path / "input"
-        output_dir = tmp_path / "shapefiles"
+        input_dir, output_dir = case_dirs
         write_json_file(input_dir / "data.json", normalized_doc)
 
-        main(["--input_dir", str(input_dir), "--output_dir", str(output_dir)])
+        main(["--input_dir", str(input_dir), "--output_dir", str(output_dir),
+              "--jobs", "1"])
 
         shp_path = output_dir / "data" / "data"
-        sf = shapefile.Reader(str(shp_path))
-        records = sf.records()
+        sf = read_shapefile(shp_path)
+        first = sf.record(0)
 
-        field_names = [f[0] for f in sf.fields[1:]]
+        field_names = sf.field_names
         id_idx = field_names.index("id")
         trips_idx = field_names.index("trips")
         trips_pct_idx = field_names.index("trips_pct")
 
         # First node: id=0, trips=100, trips_pct=50.0
-        assert records[0][id_idx] == 0
-        assert records[0][trips_idx] == 100
-        assert records[0][trips_pct_idx] == pytest.approx(50.0, abs=0.01)
+        assert first[id_idx] == 0
+        assert first[trips_idx] == 100
+        assert first[trips_pct_idx] == pytest.approx(50.0, abs=0.01)
 
 
 # ─── Integration tests: merge mode ─────────────────────────────────────
 
 
-class TestMergeMode:
-    def _setup_merge_input(self, normalized_doc, tmp_path):
-        """Create incoming + outgoing JSON files in a temp dir."""
-        input_dir = tmp_path / "input"
-        write_json_file(
-            input_dir / "123_incoming_0_0.json", normalized_doc
-        )
-        write_json_file(
-            input_dir / "123_outgoing_0_0.json", normalized_doc
-        )
-        return input_dir
+def _setup_merge_input(doc: dict, tmp_path: Path) -> Path:
+    """Create incoming + outgoing JSON files in a temp dir."""
+    input_dir = tmp_path / "input"
+    write_json_file(input_dir / "123_incoming_0_0.json", doc)
+    write_json_file(input_dir / "123_outgoing_0_0.json", doc)
+    return input_dir
+
+
+@pytest.fixture(scope="class", params=["stream", "load"])
+def merged_output(request, normalized_doc, tmp_path_factory):
+    """Run --merge once per node backend; tests only inspect the output.
+
+    Class-scoped, so the backend is switched here rather than through
+    the function-scoped node_backend fixture.
+    """
+    if request.param == "stream" and json_to_shapefile.ijson is None:
+        pytest.skip("ijson not installed")
+    base = tmp_path_factory.mktemp("merge")
+    input_dir = _setup_merge_input(normalized_doc, base)
+    output_dir = base / "shapefiles"
+    with pytest.MonkeyPatch.context() as mp:
+        if request.param == "load":
+            mp.setattr(json_to_shapefile, "ijson", None)
+        ret = main(["--input_dir", str(input_dir),
+                    "--output_dir", str(output_dir), "--merge", "--jobs", "1"])
+    return output_dir, ret
 
-    def test_creates_two_shapefiles(self, normalized_doc, tmp_path):
-        input_dir = self._setup_merge_input(normalized_doc, tmp_path)
-        output_dir = tmp_path / "shapefiles"
 
-        ret = main(["--input_dir", str(input_dir),
-                     "--output_dir", str(output_dir), "--merge"])
+class TestMergeMode:
+    def test_creates_two_shapefiles(self, merged_output):
+        output_dir, ret = merged_output
         assert ret == 0
 
         assert (output_dir / "incoming.shp").exists()
         assert (output_dir / "outgoing.shp").exists()
 
-    def test_feature_counts(self, normalized_doc, tmp_path):
-        input_dir = self._setup_merge_input(normalized_doc, tmp_path)
-        output_dir = tmp_path / "shapefiles"
-
-        main(["--input_dir", str(input_dir),
-              "--output_dir", str(output_dir), "--merge"])
+    def test_feature_counts(self, merged_output):
+        output_dir, _ = merged_output
 
-        sf_in = shapefile.Reader(str(output_dir / "incoming"))
-        sf_out = shapefile.Reader(str(output_dir / "outgoing"))
         # Each file has 3 nodes
-        assert len(sf_in) == 3
-        assert len(sf_out) == 3
+        assert len(read_shapefile(output_dir / "incoming")) == 3
+        assert len(read_shapefile(output_dir / "outgoing")) == 3
 
-    def test_source_field_present(self, normalized_doc, tmp_path):
-        input_dir = self._setup_merge_input(normalized_doc, tmp_path)
-        output_dir = tmp_path / "shapefiles"
+    def test_source_field_present(self, merged_output):
+        output_dir, _ = merged_output
 
-        main(["--input_dir", str(input_dir),
-              "--output_dir", str(output_dir), "--merge"])
-
-        sf = shapefile.Reader(str(output_dir / "incoming"))
-        field_names = [f[0] for f in sf.fields[1:]]
+        sf = read_shapefile(output_dir / "incoming")
+        field_names = sf.field_names
         assert "source" in field_names
 
         # Verify source value matches the stem of the input file
         src_idx = field_names.index("source")
-        for rec in sf.records():
+        for rec in sf.records:
             assert rec[src_idx] == "123_incoming_0_0"
 
-    def test_prj_files_created(self, normalized_doc, tmp_path):
-        input_dir = self._setup_merge_input(normalized_doc, tmp_path)
-        output_dir = tmp_path / "shapefiles"
-
-        main(["--input_dir", str(input_dir),
-              "--output_dir", str(output_dir), "--merge"])
+    def test_prj_files_created(self, merged_output):
+        output_dir, _ = merged_output
 
         assert (output_dir / "incoming.prj").exists()
         assert (output_dir / "outgoing.prj").exists()
 
-    def test_merge_multiple_files_same_direction(self, normalized_doc, tmp_path):
+
+@pytest.mark.usefixtures("node_backend")
+class TestMergeModeInputs:
+    def test_merge_multiple_files_same_direction(self, normalized_doc, case_dirs):
         """Two incoming files merged into one shapefile."""
-        input_dir = tmp_path / "input"
+        input_dir, output_dir = case_dirs
         write_json_file(input_dir / "aaa_incoming_0_0.json", normalized_doc)
         write_json_file(input_dir / "bbb_incoming_0_0.json", normalized_doc)
-        output_dir = tmp_path / "shapefiles"
 
         ret = main(["--input_dir", str(input_dir),
-                     "--output_dir", str(output_dir), "--merge"])
+                     "--output_dir", str(output_dir), "--merge", "--jobs", "1"])
         assert ret == 0
 
-        sf = shapefile.Reader(str(output_dir / "incoming"))
+        sf = read_shapefile(output_dir / "incoming")
         assert len(sf) == 6  # 3 + 3
 
         # Verify both source values are present
-        field_names = [f[0] for f in sf.fields[1:]]
-        src_idx = field_names.index("source")
-        sources = {rec[src_idx] for rec in sf.records()}
+        src_idx = sf.field_names.index("source")
+        sources = {rec[src_idx] for rec in sf.records}
         assert sources == {"aaa_incoming_0_0", "bbb_incoming_0_0"}
 
-    def test_unknown_direction_bucket(self, normalized_doc, tmp_path):
-        """File with no direction keyword → goes to 'unknown' bucket."""
-        input_dir = tmp_path / "input"
-        write_json_file(input_dir / "mydata.json", normalized_doc)
-        output_dir = tmp_path / "shapefiles"
+    def test_merge_file_missing_field(self, normalized_doc, sample_doc, case_dirs):
+        """A file lacking trips_pct gets null values for that column."""
+        input_dir, output_dir = case_dirs
+        write_json_file(input_dir / "aaa_incoming_0_0.json", normalized_doc)
+        write_json_file(input_dir / "bbb_incoming_0_0.json", sample_doc)
 
         ret = main(["--input_dir", str(input_dir),
-                     "--output_dir", str(output_dir), "--merge"])
+                     "--output_dir", str(output_dir), "--merge", "--jobs", "1"])
         assert ret == 0
-        assert (output_dir / "unknown.shp").exists()
-
 
-# ─── Edge cases and error handling ──────────────────────────────────────
+        sf = read_shapefile(output_dir / "incoming")
+        pct_idx = sf.field_names.index("trips_pct")
+        trips_idx = sf.field_names.index("trips")
+        records = sf.records
+        assert [r[pct_idx] for r in records[3:]] == [None, None, None]
+        assert [r[trips_idx] for r in records[3:]] == [100, 50, 200]
 
+    def test_merge_header_lengths(self, normalized_doc, case_dirs):
+        """.shp/.shx headers are patched with the final file lengths on close."""
+        input_dir, output_dir = case_dirs
+        for name in ("aaa", "bbb", "ccc"):
+            write_json_file(input_dir / f"{name}_incoming_0_0.json", normalized_doc)
 
-class TestShapefileEdgeCases:
-    def test_empty_input_dir(self, tmp_path):
-        input_dir = tmp_path / "empty"
-        input_dir.mkdir()
-        output_dir = tmp_path / "shapefiles"
+        main(["--input_dir", str(input_dir),
+              "--output_dir", str(output_dir), "--merge", "--jobs", "1"])
+
+        for ext in (".shp", ".shx"):
+            data = (output_dir / "incoming").with_suffix(ext).read_bytes()
+            # File length is stored big-endian in 16-bit words at byte 24
+            assert int.from_bytes(data[24:28], "big") * 2 == len(data)
+        shx = (output_dir / "incoming.shx").read_bytes()
+        assert (len(shx) - 100) // 8 == 9
+
+    def test_merge_reordered_node_format(self, normalized_doc, case_dirs):
+        """Files whose nodeFormat lists columns in a different order still line up."""
+        order = list(reversed(range(len(normalized_doc["nodeFormat"]))))
+        reordered = {
+            "nodeFormat": [normalized_doc["nodeFormat"][i] for i in order],
+            "nodes": [[node[i] for i in order] for node in normalized_doc["nodes"]],
+        }
+        input_dir, output_dir = case_dirs
+        write_json_file(input_dir / "aaa_incoming_0_0.json", normalized_doc)
+        write_json_file(input_dir / "bbb_incoming_0_0.json", reordered)
 
-        ret = main(["--input_dir", str(input_dir), "--output_dir", str(output_dir)])
+        ret = main(["--input_dir", str(input_dir),
+                     "--output_dir", str(output_dir), "--merge", "--jobs", "1"])
         assert ret == 0
 
-    def test_malformed_json(self, tmp_path):
-        input_dir = tmp_path / "input"
-        input_dir.mkdir(parents=True)
-        (input_dir / "bad.json").write_text("{nope!!")
-        output_dir = tmp_path / "shapefiles"
+        sf = read_shapefile(output_dir / "incoming")
+        records = [rec[:-1] for rec in sf.records]  # drop "source"
+        assert records[3:] == records[:3]
+        assert [s.points for s in sf.shapes[3:]] == [s.points for s in sf.shapes[:3]]
+
+    def test_first_file_loaded_once(self, normalized_doc, case_dirs, monkeypatch):
+        """The doc peeked for field detection is reused, not parsed again."""
+        base, output_dir = case_dirs
+        input_dir = _setup_merge_input(normalized_doc, base)
+        loaded = []
+        real_load_doc = json_to_shapefile.load_doc
+        monkeypatch.setattr(
+            json_to_shapefile, "load_doc",
+            lambda path: loaded.append(path.name) or real_load_doc(path),
+        )
 
-        ret = main(["--input_dir", str(input_dir), "--output_dir", str(output_dir)])
-        assert ret == 1
+        ret = main(["--input_dir", str(input_dir),
+                     "--output_dir", str(output_dir), "--merge", "--jobs", "1"])
+        assert ret == 0
+        assert sorted(loaded) == ["123_incoming_0_0.json", "123_outgoing_0_0.json"]
 
-    def test_invalid_structure(self, tmp_path):
-        input_dir = tmp_path / "input"
-        output_dir = tmp_path / "shapefiles"
-        write_json_file(input_dir / "bad.json", {"wrong": True})
+        assert len(read_shapefile(output_dir / "incoming")) == 3
 
-        ret = main(["--input_dir", str(input_dir), "--output_dir", str(output_dir)])
+    def test_merge_truncated_file_adds_nothing(self, normalized_doc, case_dirs, capsys):
+        """A file with a syntax error inside 'nodes' contributes no features."""
+        input_dir, output_dir = case_dirs
+        write_json_file(input_dir / "aaa_incoming_0_0.json", normalized_doc)
+        bad = write_json_file(input_dir / "bbb_incoming_0_0.json", normalized_doc)
+        bad.write_bytes(bad.read_bytes()[:-20])
+
+        ret = main(["--input_dir", str(input_dir),
+                     "--output_dir", str(output_dir), "--merge", "--jobs", "1"])
         assert ret == 1
+        assert len(read_shapefile(output_dir / "incoming")) == 3
+        err = capsys.readouterr().err
+        assert "bbb_incoming_0_0.json: failed to read" in err
+        assert "(3 features)" in err
+
+    @pytest.mark.parametrize("bad_node", [
+        pytest.param(_make_node(5, None, 1, 3, [[8.0, 47.0], [8.1]]), id="short_point"),
+        pytest.param(_make_node({"x": 1}, None, 1, 3, SAMPLE_COORDS_B), id="dict_id"),
+    ])
+    def test_merge_conversion_failure_keeps_files_in_step(self, bad_node, case_dirs):
+        """A node that fails mid-file leaves .shp and .dbf with equal counts."""
+        fmt = list(STANDARD_NODE_FORMAT)
+        input_dir, output_dir = case_dirs
+        write_json_file(input_dir / "aaa_incoming_0_0.json",
+                        {"nodeFormat": fmt, "nodes": [bad_node]})
+        write_json_file(input_dir / "bbb_incoming_0_0.json",
+                        {"nodeFormat": fmt, "nodes": [_make_node(2, 0, 200, 1, SAMPLE_COORDS_C)]})
 
-    def test_nonexistent_input_dir(self, tmp_path):
-        ret = main(["--input_dir", str(tmp_path / "nope"),
-                     "--output_dir", str(tmp_path / "out")])
+        ret = main(["--input_dir", str(input_dir),
+                     "--output_dir", str(output_dir), "--merge", "--jobs", "1"])
         assert ret == 1
+        sf = read_shapefile(output_dir / "incoming")
+        shapes, records = sf.shapes, sf.records
+        assert len(shapes) == len(records)
+        assert [list(p) for p in shapes[-1].points] == SAMPLE_COORDS_C
+        assert records[-1][0] == 2
+
+    def test_unknown_direction_bucket(self, normalized_doc, case_dirs):
+        """File with no direction keyword → goes to 'unknown' bucket."""
+        input_dir, output_dir = case_dirs
+        write_json_file(input_dir / "mydata.json", normalized_doc)
+
+        ret = main(["--input_dir", str(input_dir),
+                     "--output_dir", str(output_dir), "--merge", "--jobs", "1"])
+        assert ret == 0
+        assert (output_dir / "unknown.shp").exists()
 
-    def test_nonexistent_input_file(self, tmp_path):
-        ret = main(["--input_file", str(tmp_path / "nope.json"),
-                     "--output_dir", str(tmp_path / "out")])
+
+# ─── Edge cases and error handling ──────────────────────────────────────
+
+
+@pytest.mark.usefixtures("node_backend")
+class TestShapefileEdgeCases:
+    @pytest.mark.parametrize("setup, expected_ret", [
+        pytest.param(_empty_dir, 0, id="empty_input_dir"),          # no crash
+        pytest.param(_malformed_json, 1, id="malformed_json"),      # file skipped
+        pytest.param(_invalid_structure, 1, id="invalid_structure"),
+        pytest.param(_missing_dir, 1, id="nonexistent_input_dir"),
+    ])
+    def test_bad_input_exit_code(self, case_dirs, setup, expected_ret):
+        """Bad input is reported through the exit code, never raised."""
+        input_dir, output_dir = case_dirs
+        setup(input_dir)
+
+        ret = main(["--input_dir", str(input_dir), "--output_dir", str(output_dir),
+                    "--jobs", "1"])
+        assert ret == expected_ret
+
+    def test_json_suffix_matched_like_glob(self, tmp_path, monkeypatch):
+        """Upper-case .JSON names are listed where the OS ignores case."""
+        for name in ("b.JSON", "a.json", "c.txt"):
+            (tmp_path / name).write_text("{}")
+        monkeypatch.setattr(os.path, "normcase", ntpath.normcase)  # as on Windows
+        assert [p.name for p in list_json_files(tmp_path)] == ["a.json", "b.JSON"]
+
+    def test_nonexistent_input_file(self, case_dirs):
+        input_dir, output_dir = case_dirs
+        ret = main(["--input_file", str(input_dir / "nope.json"),
+                     "--output_dir", str(output_dir), "--jobs", "1"])
         assert ret == 1
 
-    def test_nodes_with_short_geometry_skipped(self, tmp_path):
+    def test_nodes_with_short_geometry_skipped(self, case_dirs):
         """Nodes with < 2 coordinate pairs are silently skipped."""
         doc = {
             "nodeFormat": list(STANDARD_NODE_FORMAT) + ["trips_pct"],
@@ -367,45 +628,81 @@ class TestShapefileEdgeCases:
                 [2, 0, 10, 1, [], 0, 0, 5.0],
                 # Invalid: null geometry
                 [3, 0, 10, 1, None, 0, 0, 5.0],
+                # Invalid: non-array geometry
+                [4, 0, 10, 1, "LINESTRING(7 47, 8 48)", 0, 0, 5.0],
+                [5, 0, 10, 1, 42, 0, 0, 5.0],
             ],
         }
-        input_dir = tmp_path / "input"
-        output_dir = tmp_path / "shapefiles"
+        input_dir, output_dir = case_dirs
         write_json_file(input_dir / "data.json", doc)
 
-        ret = main(["--input_dir", str(input_dir), "--output_dir", str(output_dir)])
+        ret = main(["--input_dir", str(input_dir), "--output_dir", str(output_dir),
+                    "--jobs", "1"])
         assert ret == 0
 
         shp_path = output_dir / "data" / "data"
-        sf = shapefile.Reader(str(shp_path))
-        assert len(sf) == 1  # only the first node has valid geometry
+        # only the first node has valid geometry
+        assert len(read_shapefile(shp_path)) == 1
 
-    def test_mixed_valid_and_invalid_files(self, normalized_doc, tmp_path):
+    def test_mixed_valid_and_invalid_files(self, normalized_doc, case_dirs):
         """Good file processes, bad file is reported, exit code is 1."""
-        input_dir = tmp_path / "input"
-        output_dir = tmp_path / "shapefiles"
+        input_dir, output_dir = case_dirs
         write_json_file(input_dir / "good.json", normalized_doc)
         write_json_file(input_dir / "bad.json", {"wrong": True})
 
-        ret = main(["--input_dir", str(input_dir), "--output_dir", str(output_dir)])
+        ret = main(["--input_dir", str(input_dir), "--output_dir", str(output_dir),
+                    "--jobs", "1"])
         assert ret == 1
         # Good file still produced output
         assert (output_dir / "good" / "good.shp").exists()
 
+    def test_truncated_nodes_writes_nothing(self, normalized_doc, case_dirs, capsys):
+        """A syntax error inside 'nodes' leaves no partial shapefile behind."""
+        input_dir, output_dir = case_dirs
+        write_json_file(input_dir / "good.json", normalized_doc)
+        bad = write_json_file(input_dir / "bad.json", normalized_doc)
+        bad.write_bytes(bad.read_bytes()[:-20])
+
+        ret = main(["--input_dir", str(input_dir), "--output_dir", str(output_dir),
+                    "--jobs", "1"])
+        assert ret == 1
+        assert len(read_shapefile(output_dir / "good" / "good")) == 3
+        assert not (output_dir / "bad").exists()
+        assert "bad.json: failed to read" in capsys.readouterr().err
+
+    def test_parallel_jobs(self, normalized_doc, case_dirs):
+        """--jobs > 1 converts each file in a worker and still reports failures."""
+        input_dir, output_dir = case_dirs
+        for name in ("a", "b", "c"):
+            write_json_file(input_dir / f"{name}.json", normalized_doc)
+        write_json_file(input_dir / "bad.json", {"wrong": True})
+
+        ret = main(["--input_dir", str(input_dir), "--output_dir", str(output_dir),
+                    "--jobs", "2"])
+        assert ret == 1
+        for name in ("a", "b", "c"):
+            assert len(read_shapefile(output_dir / name / name)) == 3
+        assert not (output_dir / "bad").exists()
+
+    def test_jobs_must_be_positive(self, case_dirs):
+        input_dir, output_dir = case_dirs
+        with pytest.raises(SystemExit):
+            main(["--input_dir", str(input_dir), "--output_dir", str(output_dir),
+                  "--jobs", "0"])
+
     def test_input_file_and_input_dir_mutually_exclusive(self):
         with pytest.raises(SystemExit):
             main(["--input_file", "a.json", "--input_dir", "dir",
                   "--output_dir", "out"])
 
-    def test_geometry_is_polyline(self, normalized_doc, tmp_path):
+    def test_geometry_is_polyline(self, normalized_doc, case_dirs):
         """All output shapes should be POLYLINE type."""
-        input_dir = tmp_path / "input"
-        output_dir = tmp_path / "shapefiles"
+        input_dir, output_dir = case_dirs
         write_json_file(input_dir / "data.json", normalized_doc)
 
-        main(["--input_dir", str(input_dir), "--output_dir", str(output_dir)])
+        main(["--input_dir", str(input_dir), "--output_dir", str(output_dir),
+              "--jobs", "1"])
 
-        shp_path = output_dir / "data" / "data"
-        sf = shapefile.Reader(str(shp_path))
-        for shape in sf.shapes():
-            assert shape.shapeType == shapefile.POLYLINE
+        file_type, record_types = shp_shape_types(output_dir / "data" / "data.shp")
+        assert file_type == shapefile.POLYLINE
+        assert record_types == [shapefile.POLYLINE] * 3
@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import copy
 import json
 import sys
 from pathlib import Path
@@ -11,8 +12,12 @@ import pytest
 # Ensure the repo root is importable
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
-from normalize_trips import process_doc, validate_doc, main
-from tests.conftest import write_json_file, STANDARD_NODE_FORMAT
+import normalize_trips
+from normalize_trips import process_doc, validate_doc, read_json, write_json, main
+from tests.conftest import (
+    write_json_file, read_json_file, STANDARD_NODE_FORMAT,
+    _empty_dir, _malformed_json, _invalid_structure, _missing_dir,
+)
 
 
 # ─── Unit tests: validate_doc ───────────────────────────────────────────
@@ -22,71 +27,76 @@ class TestValidateDoc:
     def test_valid_doc(self, sample_doc):
         assert validate_doc(sample_doc, Path("test.json")) is None
 
-    def test_not_a_dict(self):
-        err = validate_doc([], Path("test.json"))
-        assert err is not None
-        assert "not a JSON object" in err
-
-    def test_missing_node_format(self):
-        doc = {"nodes": []}
-        err = validate_doc(doc, Path("test.json"))
-        assert err is not None
-        assert "nodeFormat" in err
-
-    def test_missing_nodes(self):
-        doc = {"nodeFormat": STANDARD_NODE_FORMAT}
-        err = validate_doc(doc, Path("test.json"))
-        assert err is not None
-        assert "nodes" in err
-
-    def test_node_format_not_a_list(self):
-        doc = {"nodeFormat": "not_a_list", "nodes": []}
+    @pytest.mark.parametrize("doc, message", [
+        pytest.param([], "not a JSON object", id="not_a_dict"),
+        pytest.param({"nodes": []}, "nodeFormat", id="missing_node_format"),
+        pytest.param({"nodeFormat": STANDARD_NODE_FORMAT}, "nodes", id="missing_nodes"),
+        pytest.param({"nodeFormat": "not_a_list", "nodes": []}, "not an array",
+                     id="node_format_not_a_list"),
+        pytest.param(
+            {"nodeFormat": ["trips", "id", "parentId", "frc",
+                            "geometry", "processingFailures", "privacyTrims"],
+             "nodes": []},
+            "do not match", id="wrong_field_order",
+        ),
+        pytest.param(
+            {"nodeFormat": list(STANDARD_NODE_FORMAT), "nodes": [[1, 2, 3]]},
+            "3 elements", id="node_wrong_element_count",
+        ),
+        pytest.param(
+            {"nodeFormat": list(STANDARD_NODE_FORMAT), "nodes": ["not_a_node"]},
+            "not an array", id="node_not_an_array",
+        ),
+        pytest.param(
+            {"nodeFormat": list(STANDARD_NODE_FORMAT), "nodes": "not_a_list"},
+            "not an array", id="nodes_not_a_list",
+        ),
+    ])
+    def test_invalid(self, doc, message):
         err = validate_doc(doc, Path("test.json"))
         assert err is not None
-        assert "not an array" in err
+        assert message in err
 
-    def test_wrong_field_order(self):
-        doc = {
-            "nodeFormat": ["trips", "id", "parentId", "frc",
-                           "geometry", "processingFailures", "privacyTrims"],
-            "nodes": [],
-        }
-        err = validate_doc(doc, Path("test.json"))
-        assert err is not None
-        assert "do not match" in err
-
-    def test_node_wrong_element_count(self):
+    def test_bad_node_after_many_good_ones(self, sample_doc):
+        """Every node is checked, not just a sample."""
+        good = sample_doc["nodes"][0]
         doc = {
             "nodeFormat": list(STANDARD_NODE_FORMAT),
-            "nodes": [[1, 2, 3]],  # too few elements
+            "nodes": [list(good) for _ in range(500)] + [[1, 2]] + [list(good)],
         }
         err = validate_doc(doc, Path("test.json"))
         assert err is not None
-        assert "3 elements" in err
+        assert "node[500]" in err
+
+    def test_list_subclass_nodes_accepted(self, sample_doc):
+        class NodeList(list):
+            pass
 
-    def test_node_not_an_array(self):
         doc = {
             "nodeFormat": list(STANDARD_NODE_FORMAT),
-            "nodes": ["not_a_node"],
+            "nodes": [NodeList(node) for node in sample_doc["nodes"]],
         }
-        err = validate_doc(doc, Path("test.json"))
-        assert err is not None
-        assert "not an array" in err
-
-    def test_nodes_not_a_list(self):
-        doc = {"nodeFormat": list(STANDARD_NODE_FORMAT), "nodes": "not_a_list"}
-        err = validate_doc(doc, Path("test.json"))
-        assert err is not None
-        assert "not an array" in err
+        assert validate_doc(doc, Path("test.json")) is None
 
 
 # ─── Unit tests: process_doc ────────────────────────────────────────────
 
 
+@pytest.fixture(params=["numpy", "python"])
+def pct_backend(request, monkeypatch):
+    """Run a test with NumPy (when installed) and with the pure-Python path."""
+    if request.param == "python":
+        monkeypatch.setattr(normalize_trips, "np", None)
+    elif normalize_trips.np is None:
+        pytest.skip("numpy not installed")
+    return request.param
+
+
+@pytest.mark.usefixtures("pct_backend")
 class TestProcessDoc:
     def test_normal_percentages(self, sample_doc):
         """trips=[100, 50, 200] → trips_pct=[50.0, 25.0, 100.0]"""
-        result = process_doc(sample_doc, round_n=2)
+        result = process_doc(copy.deepcopy(sample_doc), round_n=2)
         assert "trips_pct" in result["nodeFormat"]
         pct_idx = result["nodeFormat"].index("trips_pct")
         values = [node[pct_idx] for node in result["nodes"]]
@@ -94,20 +104,20 @@ class TestProcessDoc:
 
     def test_all_zeros(self, sample_doc_all_zero):
         """All trips=0 → all trips_pct=0.0 (no division by zero)."""
-        result = process_doc(sample_doc_all_zero, round_n=2)
+        result = process_doc(copy.deepcopy(sample_doc_all_zero), round_n=2)
         pct_idx = result["nodeFormat"].index("trips_pct")
         values = [node[pct_idx] for node in result["nodes"]]
         assert values == [0.0, 0.0]
 
     def test_null_trips(self, sample_doc_with_nulls):
         """trips=[100, None, 0] → trips_pct=[100.0, 0.0, 0.0]"""
-        result = process_doc(sample_doc_with_nulls, round_n=2)
+        result = process_doc(copy.deepcopy(sample_doc_with_nulls), round_n=2)
         pct_idx = result["nodeFormat"].index("trips_pct")
         values = [node[pct_idx] for node in result["nodes"]]
         assert values == [100.0, 0.0, 0.0]
 
     def test_rounding_zero_decimals(self, sample_doc):
-        result = process_doc(sample_doc, round_n=0)
+        result = process_doc(copy.deepcopy(sample_doc), round_n=0)
         pct_idx = result["nodeFormat"].index("trips_pct")
         values = [node[pct_idx] for node in result["nodes"]]
         assert values == [50.0, 25.0, 100.0]
@@ -127,11 +137,41 @@ class TestProcessDoc:
         assert result["nodes"][0][pct_idx] == 33.0
         assert result["nodes"][1][pct_idx] == 100.0
 
+    @pytest.mark.parametrize("trips, max_trips, expected", [
+        (23, 40, 57.0),   # 57.49999999999999, not 57.5
+        (11, 88, 12.0),   # exactly 12.5, rounds half to even
+    ])
+    def test_rounding_non_exact_ratios(self, trips, max_trips, expected):
+        doc = {
+            "nodeFormat": list(STANDARD_NODE_FORMAT),
+            "nodes": [
+                [0, None, trips, 3, [[0, 0], [1, 1]], 0, 0],
+                [1, 0, max_trips, 2, [[0, 0], [1, 1]], 0, 0],
+            ],
+        }
+        result = process_doc(doc, round_n=0)
+        assert result["nodes"][0][-1] == expected
+
+    @pytest.mark.parametrize("round_n", [0, 1, 2, 4, 8, 9])
+    def test_matches_reference_formula(self, round_n):
+        """Every value equals round((trips / max_trips) * 100, round_n)."""
+        # Ratios such as 1/4000 scale to within an ulp of a .5 boundary
+        trips = list(range(0, 4001)) + [12.5, 0.125, 1e-9]
+        doc = {
+            "nodeFormat": list(STANDARD_NODE_FORMAT),
+            "nodes": [[i, None, t, 3, [[0, 0], [1, 1]], 0, 0] for i, t in enumerate(trips)],
+        }
+        result = process_doc(doc, round_n=round_n)
+        max_trips = max(trips)
+        expected = [round((t / max_trips) * 100, round_n) for t in trips]
+        assert [node[-1] for node in result["nodes"]] == expected
+
     def test_appends_field_to_node_format(self, sample_doc):
-        original_len = len(sample_doc["nodeFormat"])
-        process_doc(sample_doc, round_n=2)
-        assert len(sample_doc["nodeFormat"]) == original_len + 1
-        assert sample_doc["nodeFormat"][-1] == "trips_pct"
+        doc = copy.deepcopy(sample_doc)
+        original_len = len(doc["nodeFormat"])
+        process_doc(doc, round_n=2)
+        assert len(doc["nodeFormat"]) == original_len + 1
+        assert doc["nodeFormat"][-1] == "trips_pct"
 
     def test_single_node(self):
         """A single node with trips > 0 → trips_pct = 100.0."""
@@ -143,25 +183,93 @@ class TestProcessDoc:
         pct_idx = result["nodeFormat"].index("trips_pct")
         assert result["nodes"][0][pct_idx] == 100.0
 
+    def test_empty_nodes(self):
+        doc = {"nodeFormat": list(STANDARD_NODE_FORMAT), "nodes": []}
+        result = process_doc(doc, round_n=2)
+        assert result["nodes"] == []
+        assert result["nodeFormat"][-1] == "trips_pct"
+
+    def test_matches_normalized_doc_fixture(self, normalized_doc):
+        """The hand-built normalized_doc fixture is real process_doc output."""
+        raw = {
+            "nodeFormat": normalized_doc["nodeFormat"][:-1],
+            "nodes": [node[:-1] for node in normalized_doc["nodes"]],
+        }
+        assert process_doc(raw, round_n=2) == normalized_doc
+
+    def test_values_are_python_floats(self, sample_doc):
+        """NumPy scalars must not leak into the doc (the JSON writers reject them)."""
+        result = process_doc(copy.deepcopy(sample_doc), round_n=2)
+        assert all(type(node[-1]) is float for node in result["nodes"])
+
+
+# ─── Unit tests: read_json / write_json ─────────────────────────────────
+
+
+@pytest.fixture(params=["orjson", "stdlib"])
+def json_backend(request, monkeypatch):
+    """Run a test with orjson (when installed) and with the stdlib fallback."""
+    if request.param == "stdlib":
+        monkeypatch.setattr(normalize_trips, "orjson", None)
+    elif normalize_trips.orjson is None:
+        pytest.skip("orjson not installed")
+    return request.param
+
+
+class TestJsonIO:
+    def test_round_trip(self, sample_doc, tmp_path, json_backend):
+        path = tmp_path / "data.json"
+        write_json(path, sample_doc)
+        assert read_json(path) == sample_doc
+
+    def test_compact_matches_stdlib(self, sample_doc, tmp_path, json_backend):
+        path = tmp_path / "data.json"
+        write_json(path, sample_doc)
+        expected = json.dumps(sample_doc, ensure_ascii=False, separators=(",", ":"))
+        assert path.read_text(encoding="utf-8") == expected + "\n"
+
+    def test_pretty_matches_stdlib(self, sample_doc, tmp_path, json_backend):
+        path = tmp_path / "data.json"
+        write_json(path, sample_doc, pretty=True)
+        expected = json.dumps(sample_doc, ensure_ascii=False, indent=2)
+        assert path.read_text(encoding="utf-8") == expected + "\n"
+
+    def test_exponent_floats_round_trip(self, tmp_path, json_backend):
+        """orjson spells these differently from stdlib but reads back equal."""
+        doc = {"values": [0.00001, 1e16, 1.5e-7]}
+        path = tmp_path / "data.json"
+        write_json(path, doc)
+        assert read_json(path) == doc
+
+    def test_non_ascii_written_as_utf8(self, tmp_path, json_backend):
+        path = tmp_path / "data.json"
+        write_json(path, {"name": "Zürich–Ost"})
+        assert path.read_bytes() == '{"name":"Zürich–Ost"}\n'.encode("utf-8")
+
+    def test_malformed_raises_json_decode_error(self, tmp_path, json_backend):
+        path = tmp_path / "bad.json"
+        path.write_text("{nope!!")
+        with pytest.raises(json.JSONDecodeError):
+            read_json(path)
+
 
 # ─── Integration tests: main() via CLI args ─────────────────────────────
 
 
 class TestNormalizeIntegration:
-    def test_output_dir_mode(self, sample_doc, tmp_path):
+    def test_output_dir_mode(self, sample_doc, case_dirs):
         """Full round-trip: write JSON, run main(), read output."""
-        input_dir = tmp_path / "input"
-        output_dir = tmp_path / "output"
+        input_dir, output_dir = case_dirs
         write_json_file(input_dir / "data.json", sample_doc)
 
-        ret = main(["--input_dir", str(input_dir), "--output_dir", str(output_dir)])
+        ret = main(["--input_dir", str(input_dir), "--output_dir", str(output_dir),
+                    "--jobs", "1"])
         assert ret == 0
 
         out_file = output_dir / "data.json"
         assert out_file.exists()
 
-        with open(out_file) as f:
-            result = json.load(f)
+        result = read_json_file(out_file)
 
         assert "trips_pct" in result["nodeFormat"]
         assert len(result["nodes"]) == 3
@@ -170,63 +278,59 @@ class TestNormalizeIntegration:
         values = [node[pct_idx] for node in result["nodes"]]
         assert values == [50.0, 25.0, 100.0]
 
-    def test_inplace_mode(self, sample_doc, tmp_path):
-        input_dir = tmp_path / "data"
+    def test_inplace_mode(self, sample_doc, case_dirs):
+        input_dir, _ = case_dirs
         filepath = write_json_file(input_dir / "test.json", sample_doc)
 
-        ret = main(["--input_dir", str(input_dir), "--inplace"])
+        ret = main(["--input_dir", str(input_dir), "--inplace", "--jobs", "1"])
         assert ret == 0
 
-        with open(filepath) as f:
-            result = json.load(f)
+        result = read_json_file(filepath)
         assert "trips_pct" in result["nodeFormat"]
 
-    def test_pretty_print(self, sample_doc, tmp_path):
-        input_dir = tmp_path / "input"
-        output_dir = tmp_path / "output"
+    def test_pretty_print(self, sample_doc, case_dirs):
+        input_dir, output_dir = case_dirs
         write_json_file(input_dir / "data.json", sample_doc)
 
         main(["--input_dir", str(input_dir), "--output_dir", str(output_dir),
-              "--pretty"])
+              "--pretty", "--jobs", "1"])
 
         text = (output_dir / "data.json").read_text()
         # Pretty-printed JSON has newlines and indentation
         assert "\n" in text
         assert "  " in text
 
-    def test_compact_output(self, sample_doc, tmp_path):
-        input_dir = tmp_path / "input"
-        output_dir = tmp_path / "output"
+    def test_compact_output(self, sample_doc, case_dirs):
+        input_dir, output_dir = case_dirs
         write_json_file(input_dir / "data.json", sample_doc)
 
-        main(["--input_dir", str(input_dir), "--output_dir", str(output_dir)])
+        main(["--input_dir", str(input_dir), "--output_dir", str(output_dir),
+              "--jobs", "1"])
 
         text = (output_dir / "data.json").read_text().strip()
         # Compact JSON has no spaces after separators (except within values)
         assert "\n" not in text.rstrip("\n")
 
-    def test_custom_rounding(self, sample_doc, tmp_path):
-        input_dir = tmp_path / "input"
-        output_dir = tmp_path / "output"
+    def test_custom_rounding(self, sample_doc, case_dirs):
+        input_dir, output_dir = case_dirs
         write_json_file(input_dir / "data.json", sample_doc)
 
         main(["--input_dir", str(input_dir), "--output_dir", str(output_dir),
-              "--round", "0"])
+              "--round", "0", "--jobs", "1"])
 
-        with open(output_dir / "data.json") as f:
-            result = json.load(f)
+        result = read_json_file(output_dir / "data.json")
         pct_idx = result["nodeFormat"].index("trips_pct")
         for node in result["nodes"]:
             assert node[pct_idx] == int(node[pct_idx])
 
-    def test_multiple_files(self, sample_doc, tmp_path):
+    def test_multiple_files(self, sample_doc, case_dirs):
         """Process multiple JSON files in one batch."""
-        input_dir = tmp_path / "input"
-        output_dir = tmp_path / "output"
+        input_dir, output_dir = case_dirs
         write_json_file(input_dir / "a.json", sample_doc)
         write_json_file(input_dir / "b.json", sample_doc)
 
-        ret = main(["--input_dir", str(input_dir), "--output_dir", str(output_dir)])
+        ret = main(["--input_dir", str(input_dir), "--output_dir", str(output_dir),
+                    "--jobs", "1"])
         assert ret == 0
         assert (output_dir / "a.json").exists()
         assert (output_dir / "b.json").exists()
@@ -236,49 +340,64 @@ class TestNormalizeIntegration:
 
 
 class TestNormalizeEdgeCases:
-    def test_empty_input_dir(self, tmp_path):
-        """Empty directory → return 0, no crash."""
-        input_dir = tmp_path / "empty"
-        input_dir.mkdir()
-        output_dir = tmp_path / "output"
-
-        ret = main(["--input_dir", str(input_dir), "--output_dir", str(output_dir)])
-        assert ret == 0
-
-    def test_malformed_json(self, tmp_path):
-        """Invalid JSON → skip file, return 1."""
-        input_dir = tmp_path / "input"
-        input_dir.mkdir(parents=True)
-        (input_dir / "bad.json").write_text("{invalid json!!")
-        output_dir = tmp_path / "output"
-
-        ret = main(["--input_dir", str(input_dir), "--output_dir", str(output_dir)])
-        assert ret == 1
-
-    def test_invalid_structure(self, tmp_path):
-        """Valid JSON but wrong structure → skip file, return 1."""
-        input_dir = tmp_path / "input"
-        output_dir = tmp_path / "output"
-        write_json_file(input_dir / "bad.json", {"wrong": "structure"})
-
-        ret = main(["--input_dir", str(input_dir), "--output_dir", str(output_dir)])
-        assert ret == 1
-
-    def test_mixed_valid_and_invalid(self, sample_doc, tmp_path):
+    @pytest.mark.parametrize("setup, expected_ret", [
+        pytest.param(_empty_dir, 0, id="empty_input_dir"),          # no crash
+        pytest.param(_malformed_json, 1, id="malformed_json"),      # file skipped
+        pytest.param(_invalid_structure, 1, id="invalid_structure"),
+        pytest.param(_missing_dir, 1, id="nonexistent_input_dir"),
+    ])
+    def test_bad_input_exit_code(self, case_dirs, setup, expected_ret):
+        """Bad input is reported through the exit code, never raised."""
+        input_dir, output_dir = case_dirs
+        setup(input_dir)
+
+        ret = main(["--input_dir", str(input_dir), "--output_dir", str(output_dir),
+                    "--jobs", "1"])
+        assert ret == expected_ret
+
+    def test_mixed_valid_and_invalid(self, sample_doc, case_dirs):
         """One good file + one bad file → processes good, reports failure."""
-        input_dir = tmp_path / "input"
-        output_dir = tmp_path / "output"
+        input_dir, output_dir = case_dirs
         write_json_file(input_dir / "good.json", sample_doc)
         write_json_file(input_dir / "bad.json", {"wrong": "structure"})
 
-        ret = main(["--input_dir", str(input_dir), "--output_dir", str(output_dir)])
+        ret = main(["--input_dir", str(input_dir), "--output_dir", str(output_dir),
+                    "--jobs", "1"])
         assert ret == 1  # reports failures
         assert (output_dir / "good.json").exists()  # but still processes the good one
 
-    def test_nonexistent_input_dir(self, tmp_path):
-        ret = main(["--input_dir", str(tmp_path / "nope"),
-                     "--output_dir", str(tmp_path / "out")])
+    def test_only_json_files_processed(self, sample_doc, case_dirs):
+        """Non-.json files and directories named *.json are ignored."""
+        input_dir, output_dir = case_dirs
+        write_json_file(input_dir / "good.json", sample_doc)
+        (input_dir / "notes.txt").write_text("not json")
+        (input_dir / "folder.json").mkdir()
+
+        ret = main(["--input_dir", str(input_dir), "--output_dir", str(output_dir),
+                    "--jobs", "1"])
+        assert ret == 0
+        assert sorted(p.name for p in output_dir.iterdir()) == ["good.json"]
+
+    def test_parallel_jobs(self, sample_doc, case_dirs):
+        """--jobs > 1 normalizes each file in a worker and still reports failures."""
+        input_dir, output_dir = case_dirs
+        for name in ("a", "b", "c"):
+            write_json_file(input_dir / f"{name}.json", sample_doc)
+        write_json_file(input_dir / "bad.json", {"wrong": "structure"})
+
+        ret = main(["--input_dir", str(input_dir), "--output_dir", str(output_dir),
+                    "--jobs", "2"])
         assert ret == 1
+        for name in ("a", "b", "c"):
+            result = read_json(output_dir / f"{name}.json")
+            assert result["nodeFormat"][-1] == "trips_pct"
+        assert not (output_dir / "bad.json").exists()
+
+    def test_jobs_must_be_positive(self, case_dirs):
+        input_dir, output_dir = case_dirs
+        with pytest.raises(SystemExit):
+            main(["--input_dir", str(input_dir), "--output_dir", str(output_dir),
+                  "--jobs", "0"])
 
     def test_inplace_and_output_dir_conflict(self):
         with pytest.raises(SystemExit):
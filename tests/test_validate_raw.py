@@ -2,7 +2,10 @@
 
 from __future__ import annotations
 
+import hashlib
 import json
+import ntpath
+import os
 import sys
 from pathlib import Path
 
@@ -10,7 +13,11 @@ import pytest
 
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
-from validate_raw import parse_filename, validate_structure, validate_raw, file_hash, main
+import validate_raw as validate_raw_module
+from validate_raw import (
+    parse_filename, validate_structure, validate_raw, load_hashed, new_hasher, main,
+    HASH_CACHE_NAME, HASH_NAME,
+)
 from tests.conftest import write_json_file, STANDARD_NODE_FORMAT, _make_node, SAMPLE_COORDS_A, SAMPLE_COORDS_B
 
 
@@ -57,9 +64,17 @@ class TestParseFilename:
     def test_no_match_bad_extension(self):
         assert parse_filename("123_incoming_0_0.csv") is None
 
+    def test_mixed_case_direction_and_extension(self):
+        parts = parse_filename("123_Outgoing_0_0.JSON")
+        assert parts is not None
+        assert parts["direction"] == "outgoing"
+
     def test_no_match_non_numeric_device(self):
         assert parse_filename("abc_incoming_0_0.json") is None
 
+    def test_no_match_non_ascii_digits(self):
+        assert parse_filename("\u0661\u0662_incoming_0_0.json") is None
+
     def test_no_match_empty(self):
         assert parse_filename("") is None
 
@@ -102,20 +117,49 @@ class TestValidateStructure:
         assert err is not None
         assert "2 elements" in err
 
+    def test_node_not_an_array(self):
+        """A node with the right length but the wrong type is still rejected."""
+        good = _good_doc()["nodes"][0]
+        doc = {
+            "nodeFormat": list(STANDARD_NODE_FORMAT),
+            "nodes": [good, dict(enumerate(good))],
+        }
+        err = validate_structure(doc, Path("x"))
+        assert err is not None
+        assert "node[1] is not an array" in err
+
+
+# ─── Unit tests: load_hashed ────────────────────────────────────────
+
 
-# ─── Unit tests: file_hash ──────────────────────────────────────────
+def _hashed_digest(path: Path) -> str:
+    """Load a file with load_hashed, walk its nodes, and return the digest."""
+    doc, hasher = load_hashed(path)
+    assert validate_structure(doc, path) is None
+    return hasher.hexdigest()
 
 
-class TestFileHash:
+@pytest.mark.usefixtures("node_backend")
+class TestLoadHashed:
     def test_same_content_same_hash(self, tmp_path):
-        (tmp_path / "a.txt").write_text("hello")
-        (tmp_path / "b.txt").write_text("hello")
-        assert file_hash(tmp_path / "a.txt") == file_hash(tmp_path / "b.txt")
+        a = _write_raw(tmp_path, "a.json")
+        b = _write_raw(tmp_path, "b.json")
+        assert _hashed_digest(a) == _hashed_digest(b)
 
     def test_different_content_different_hash(self, tmp_path):
-        (tmp_path / "a.txt").write_text("hello")
-        (tmp_path / "b.txt").write_text("world")
-        assert file_hash(tmp_path / "a.txt") != file_hash(tmp_path / "b.txt")
+        a = _write_raw(tmp_path, "a.json", _good_doc(100))
+        b = _write_raw(tmp_path, "b.json", _good_doc(200))
+        assert _hashed_digest(a) != _hashed_digest(b)
+
+    def test_digest_covers_whole_file(self, tmp_path):
+        """The digest matches a plain hash of the bytes, trailing whitespace included."""
+        fp = _write_raw(tmp_path, "a.json")
+        fp.write_bytes(fp.read_bytes() + b"\n  \n")
+        expected = new_hasher()
+        expected.update(fp.read_bytes())
+        assert _hashed_digest(fp) == expected.hexdigest()
+        if validate_raw_module.blake3 is None:
+            assert expected.hexdigest() == hashlib.sha256(fp.read_bytes()).hexdigest()
 
 
 # ─── Integration: validate_raw — clean data ─────────────────────────
@@ -170,6 +214,20 @@ class TestValidateRawBadPattern:
 # ─── Integration: bad JSON / structure ───────────────────────────────
 
 
+@pytest.fixture(params=["stream", "orjson", "stdlib"])
+def node_backend(request, monkeypatch):
+    """Run a test with ijson streaming, orjson and stdlib whole-file loads."""
+    if request.param != "stream":
+        monkeypatch.setattr(validate_raw_module, "ijson", None)
+    if request.param == "stdlib":
+        monkeypatch.setattr(validate_raw_module, "orjson", None)
+    required = {"stream": "ijson", "orjson": "orjson"}.get(request.param)
+    if required and getattr(validate_raw_module, required) is None:
+        pytest.skip(f"{required} not installed")
+    return request.param
+
+
+@pytest.mark.usefixtures("node_backend")
 class TestValidateRawBadContent:
     def test_malformed_json(self, tmp_path):
         raw = tmp_path / "raw"
@@ -188,10 +246,91 @@ class TestValidateRawBadContent:
         assert stats["bad_structure"] == 1
         assert len(errors) == 1
 
+    def test_truncated_nodes(self, tmp_path):
+        raw = tmp_path / "raw"
+        fp = _write_raw(raw, "111_incoming_0_0.json")
+        fp.write_bytes(fp.read_bytes()[:-10])
+
+        errors, warnings, stats = validate_raw(raw)
+        assert stats["bad_json"] == 1
+        assert stats["valid_files"] == 0
+
+    @pytest.mark.parametrize("data", [b"[1, 2", b"[1, 2] trailing"])
+    def test_broken_top_level_array(self, tmp_path, data):
+        """A non-object file that is also broken counts as bad JSON."""
+        raw = tmp_path / "raw"
+        raw.mkdir(parents=True)
+        (raw / "111_incoming_0_0.json").write_bytes(data)
+
+        errors, warnings, stats = validate_raw(raw)
+        assert stats["bad_json"] == 1
+        assert stats["bad_structure"] == 0
+
+    def test_empty_file(self, tmp_path):
+        raw = tmp_path / "raw"
+        raw.mkdir(parents=True)
+        (raw / "111_incoming_0_0.json").write_bytes(b"")
+
+        errors, warnings, stats = validate_raw(raw)
+        assert stats["bad_json"] == 1
+
+    def test_node_wrong_length(self, tmp_path):
+        raw = tmp_path / "raw"
+        doc = _good_doc()
+        doc["nodes"].append([1, 2])
+        _write_raw(raw, "111_incoming_0_0.json", doc)
+
+        errors, warnings, stats = validate_raw(raw)
+        assert stats["bad_structure"] == 1
+        assert "node[1] has 2 elements" in errors[0]
+
+    def test_hashed_files_still_validated(self, tmp_path):
+        """Same-size files are parsed from the bytes read for hashing."""
+        raw = tmp_path / "raw"
+        bad = _good_doc()
+        bad["nodes"].append([1, 2])
+        fp_bad = _write_raw(raw, "222_incoming_0_0.json", bad)
+        fp_good = _write_raw(raw, "111_incoming_0_0.json")
+        # Pad with trailing whitespace so both files share a size
+        fp_good.write_bytes(fp_good.read_bytes().ljust(fp_bad.stat().st_size))
+
+        errors, warnings, stats = validate_raw(raw)
+        assert stats["valid_files"] == 1
+        assert stats["bad_structure"] == 1
+        assert "222_incoming_0_0.json: node[1] has 2 elements" in errors[0]
+
+    def test_node_format_after_nodes(self, tmp_path):
+        raw = tmp_path / "raw"
+        doc = _good_doc()
+        _write_raw(raw, "111_incoming_0_0.json",
+                   {"nodes": doc["nodes"], "nodeFormat": doc["nodeFormat"]})
+
+        errors, warnings, stats = validate_raw(raw)
+        assert errors == []
+        assert stats["valid_files"] == 1
+
 
 # ─── Integration: content-hash duplicates ────────────────────────────
 
 
+def _count_hashes(monkeypatch) -> list[str]:
+    """Record the name of every file passed to load_hashed."""
+    hashed: list[str] = []
+    real_load_hashed = validate_raw_module.load_hashed
+    monkeypatch.setattr(
+        validate_raw_module, "load_hashed",
+        lambda path: hashed.append(path.name) or real_load_hashed(path),
+    )
+    return hashed
+
+
+def _big_doc(first_trips: int, last_trips: int) -> dict:
+    """Return a doc larger than HEAD_HASH_SIZE; trips vary at head and tail."""
+    nodes = [_make_node(i, None, 0, 3, SAMPLE_COORDS_A) for i in range(100)]
+    nodes[0][2], nodes[-1][2] = first_trips, last_trips
+    return {"nodeFormat": list(STANDARD_NODE_FORMAT), "nodes": nodes}
+
+
 class TestValidateRawHashDupes:
     def test_identical_files_detected(self, tmp_path):
         raw = tmp_path / "raw"
@@ -221,6 +360,153 @@ class TestValidateRawHashDupes:
         errors, warnings, stats = validate_raw(raw)
         assert stats["hash_dupes"] == 2  # 3 files, 2 extra
 
+    def test_groups_reported_in_first_file_order(self, tmp_path):
+        raw = tmp_path / "raw"
+        _write_raw(raw, "111_incoming_0_0.json", _good_doc(100))
+        _write_raw(raw, "222_incoming_0_0.json", _good_doc(200))
+        _write_raw(raw, "333_incoming_0_0.json", _good_doc(200))
+        _write_raw(raw, "444_incoming_0_0.json", _good_doc(100))
+
+        errors, warnings, stats = validate_raw(raw)
+        assert stats["hash_dupes"] == 2
+        assert [e.rsplit(": ", 1)[1] for e in errors] == [
+            "111_incoming_0_0.json, 444_incoming_0_0.json",
+            "222_incoming_0_0.json, 333_incoming_0_0.json",
+        ]
+
+    def test_only_same_size_files_hashed(self, tmp_path, monkeypatch):
+        raw = tmp_path / "raw"
+        _write_raw(raw, "111_incoming_0_0.json", _good_doc(100))
+        _write_raw(raw, "222_incoming_0_0.json", _good_doc(200))  # same size
+        _write_raw(raw, "333_incoming_0_0.json", _good_doc(12345))  # unique size
+
+        hashed = _count_hashes(monkeypatch)
+        errors, warnings, stats = validate_raw(raw)
+        assert stats["hash_dupes"] == 0
+        assert sorted(hashed) == ["111_incoming_0_0.json", "222_incoming_0_0.json"]
+
+    def test_large_files_prefiltered_on_head(self, tmp_path, monkeypatch):
+        """Same-size files over HEAD_HASH_SIZE are only fully hashed if their heads match."""
+        raw = tmp_path / "raw"
+        _write_raw(raw, "111_incoming_0_0.json", _big_doc(100, 100))
+        _write_raw(raw, "222_incoming_0_0.json", _big_doc(100, 200))  # tail differs
+        _write_raw(raw, "333_incoming_0_0.json", _big_doc(300, 100))  # head differs
+        sizes = {fp.stat().st_size for fp in raw.iterdir()}
+        assert len(sizes) == 1 and sizes.pop() > validate_raw_module.HEAD_HASH_SIZE
+
+        hashed = _count_hashes(monkeypatch)
+        errors, warnings, stats = validate_raw(raw)
+        assert stats["hash_dupes"] == 0
+        assert sorted(hashed) == ["111_incoming_0_0.json", "222_incoming_0_0.json"]
+
+
+# ─── Integration: hash cache ─────────────────────────────────────────
+
+
+class TestValidateRawHashCache:
+    def _dupe_dir(self, tmp_path) -> Path:
+        raw = tmp_path / "raw"
+        doc = _good_doc()
+        _write_raw(raw, "111_incoming_0_0.json", doc)
+        _write_raw(raw, "222_incoming_0_0.json", doc)
+        return raw
+
+    def test_off_by_default(self, tmp_path):
+        raw = self._dupe_dir(tmp_path)
+        validate_raw(raw)
+        assert not (raw / HASH_CACHE_NAME).exists()
+
+    def test_second_run_reuses_hashes(self, tmp_path, monkeypatch):
+        raw = self._dupe_dir(tmp_path)
+        validate_raw(raw, use_cache=True)
+        assert (raw / HASH_CACHE_NAME).exists()
+
+        hashed = _count_hashes(monkeypatch)
+        errors, warnings, stats = validate_raw(raw, use_cache=True)
+        assert hashed == []
+        assert stats["hash_dupes"] == 1
+        assert stats["total_files"] == 2  # the sidecar is not an input
+
+    def test_changed_file_rehashed(self, tmp_path, monkeypatch):
+        raw = self._dupe_dir(tmp_path)
+        validate_raw(raw, use_cache=True)
+
+        changed = raw / "222_incoming_0_0.json"
+        _write_raw(raw, changed.name, _good_doc(200))  # same size, new content
+        st = changed.stat()
+        os.utime(changed, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+
+        hashed = _count_hashes(monkeypatch)
+        errors, warnings, stats = validate_raw(raw, use_cache=True)
+        assert hashed == ["222_incoming_0_0.json"]
+        assert stats["hash_dupes"] == 0
+
+    def test_other_algorithm_not_reused(self, tmp_path, monkeypatch):
+        raw = self._dupe_dir(tmp_path)
+        validate_raw(raw, use_cache=True)
+        cache = json.loads((raw / HASH_CACHE_NAME).read_text())
+        for entry in cache.values():
+            entry["other"] = entry.pop(HASH_NAME)
+        (raw / HASH_CACHE_NAME).write_text(json.dumps(cache))
+
+        hashed = _count_hashes(monkeypatch)
+        errors, warnings, stats = validate_raw(raw, use_cache=True)
+        assert sorted(hashed) == ["111_incoming_0_0.json", "222_incoming_0_0.json"]
+        assert stats["hash_dupes"] == 1
+
+    def test_duplicate_order_independent_of_cache(self, tmp_path):
+        raw = self._dupe_dir(tmp_path)
+        uncached, _, _ = validate_raw(raw)
+        validate_raw(raw, use_cache=True)
+        cache = json.loads((raw / HASH_CACHE_NAME).read_text())
+        del cache["111_incoming_0_0.json"]  # only the second file is a cache hit
+        (raw / HASH_CACHE_NAME).write_text(json.dumps(cache))
+
+        errors, warnings, stats = validate_raw(raw, use_cache=True)
+        assert errors == uncached
+
+    def test_cached_files_not_head_hashed(self, tmp_path, monkeypatch):
+        raw = tmp_path / "raw"
+        _write_raw(raw, "111_incoming_0_0.json", _big_doc(100, 100))
+        _write_raw(raw, "222_incoming_0_0.json", _big_doc(100, 200))
+        validate_raw(raw, use_cache=True)
+
+        heads: list[str] = []
+        real_head_hash = validate_raw_module.file_head_hash
+        monkeypatch.setattr(
+            validate_raw_module, "file_head_hash",
+            lambda path, *args: heads.append(path.name) or real_head_hash(path, *args),
+        )
+        hashed = _count_hashes(monkeypatch)
+        validate_raw(raw, use_cache=True)
+        assert heads == [] and hashed == []
+
+    def test_new_copy_of_cached_file_detected(self, tmp_path):
+        """A unique head among uncached files can still match a cached file."""
+        raw = tmp_path / "raw"
+        _write_raw(raw, "111_incoming_0_0.json", _big_doc(100, 100))
+        _write_raw(raw, "222_incoming_0_0.json", _big_doc(300, 100))
+        validate_raw(raw, use_cache=True)
+
+        _write_raw(raw, "333_incoming_0_0.json", _big_doc(100, 100))
+        errors, warnings, stats = validate_raw(raw, use_cache=True)
+        assert stats["hash_dupes"] == 1
+
+    def test_corrupt_cache_ignored(self, tmp_path):
+        raw = self._dupe_dir(tmp_path)
+        (raw / HASH_CACHE_NAME).write_text("{broken!!")
+
+        errors, warnings, stats = validate_raw(raw, use_cache=True)
+        assert stats["hash_dupes"] == 1
+        assert warnings == []
+
+    def test_cli_flag(self, tmp_path):
+        raw = self._dupe_dir(tmp_path)
+        main(["--raw_dir", str(raw), "--no-cache"])
+        assert not (raw / HASH_CACHE_NAME).exists()
+        main(["--raw_dir", str(raw), "--cache"])
+        assert (raw / HASH_CACHE_NAME).exists()
+
 
 # ─── Integration: slot collisions ───────────────────────────────────
 
@@ -241,7 +527,7 @@ class TestValidateRawSlotCollisions:
 
         errors, warnings, stats = validate_raw(raw)
         assert stats["slot_collisions"] == 1
-        assert any("Slot collision" in e for e in errors)
+        assert any("Slot collision for [111_incoming_0_0]" in e for e in errors)
 
 
 # ─── Integration: orphan detection ───────────────────────────────────
@@ -279,6 +565,45 @@ class TestValidateRawOrphans:
         assert stats["orphans_deleted"] == 1
         assert not orphan.exists()
 
+    def test_orphans_reported_in_name_order(self, tmp_path):
+        raw = tmp_path / "raw"
+        output = tmp_path / "output"
+        _write_raw(raw, "111_incoming_0_0.json")
+        for name in ("999_incoming_0_0.json", "555_incoming_0_0.json"):
+            write_json_file(output / name, _good_doc())
+
+        errors, warnings, stats = validate_raw(raw, output)
+        assert warnings == [
+            "Orphan in output/: 555_incoming_0_0.json",
+            "Orphan in output/: 999_incoming_0_0.json",
+        ]
+
+    def test_directories_named_json_ignored(self, tmp_path):
+        raw = tmp_path / "raw"
+        output = tmp_path / "output"
+        _write_raw(raw, "111_incoming_0_0.json")
+        (raw / "222_incoming_0_0.json").mkdir()
+        (output / "999_incoming_0_0.json").mkdir(parents=True)
+
+        errors, warnings, stats = validate_raw(raw, output, delete_orphans=True)
+        assert stats["total_files"] == 1
+        assert stats["orphans"] == 0
+        assert (output / "999_incoming_0_0.json").is_dir()
+
+    def test_json_suffix_matched_like_glob(self, tmp_path, monkeypatch):
+        """Upper-case .JSON names are scanned where the OS ignores case."""
+        raw = tmp_path / "raw"
+        output = tmp_path / "output"
+        _write_raw(raw, "111_incoming_0_0.json")
+        _write_raw(raw, "222_incoming_0_0.JSON", _good_doc(trips=7))
+        write_json_file(output / "999_incoming_0_0.JSON", _good_doc())
+        monkeypatch.setattr(os.path, "normcase", ntpath.normcase)  # as on Windows
+
+        errors, warnings, stats = validate_raw(raw, output)
+        assert errors == []
+        assert stats["total_files"] == 2
+        assert warnings == ["Orphan in output/: 999_incoming_0_0.JSON"]
+
     def test_no_output_dir_skips_orphan_check(self, tmp_path):
         raw = tmp_path / "raw"
         _write_raw(raw, "111_incoming_0_0.json")
@@ -325,6 +650,25 @@ class TestMainCLI:
         ret = main(["--raw_dir", str(tmp_path / "nope")])
         assert ret == 1
 
+    def test_parallel_jobs(self, tmp_path, capsys):
+        """--jobs > 1 checks files in workers and reports the same results."""
+        raw = tmp_path / "raw"
+        _write_raw(raw, "111_incoming_0_0.json")
+        _write_raw(raw, "222_incoming_0_0.json")  # content duplicate
+        _write_raw(raw, "333_incoming_0_0.json", _good_doc(300))
+        write_json_file(raw / "444_incoming_0_0.json", {"wrong": True})
+        (raw / "555_incoming_0_0.json").write_text("{broken!!")
+
+        assert main(["--raw_dir", str(raw), "--jobs", "1"]) == 1
+        serial = capsys.readouterr().out
+        assert main(["--raw_dir", str(raw), "--jobs", "2"]) == 1
+        assert capsys.readouterr().out == serial
+        assert "Hash dupes:   1" in serial
+
+    def test_jobs_must_be_positive(self, tmp_path):
+        with pytest.raises(SystemExit):
+            main(["--raw_dir", str(tmp_path), "--jobs", "0"])
+
     def test_with_output_dir(self, tmp_path):
         raw = tmp_path / "raw"
         output = tmp_path / "output"
@@ -0,0 +1,161 @@
+"""
+tomtom_common.py – Helpers shared by the TomTom pipeline scripts.
+
+Streaming access to a file's 'nodes' array via ijson (NodeStream,
+read_header), the exceptions that mean a file could not be parsed
+(PARSE_ERRORS), the *.json directory listing, and the process-pool map
+used by each script's --jobs.
+
+Optional dependencies:
+    pip install ijson     # required for NodeStream / read_header
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from fnmatch import fnmatch
+from pathlib import Path
+
+try:
+    import ijson
+except ImportError:  # optional dependency
+    ijson = None
+
+# Exceptions that mean an input file could not be read or parsed.
+PARSE_ERRORS: tuple[type[Exception], ...] = (json.JSONDecodeError, OSError)
+if ijson is not None:
+    PARSE_ERRORS += (ijson.JSONError,)
+
+# Read size used when draining the unparsed tail of a file being hashed
+HASH_CHUNK_SIZE = 256 * 1024
+
+
+class HashingReader:
+    """Binary file wrapper that feeds every byte read through it to a hasher.
+
+    Lets a parser and the content hash share one read of the file.
+    """
+
+    def __init__(self, f, hasher) -> None:
+        self.f = f
+        self.hasher = hasher
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.f.read(size)
+        self.hasher.update(data)
+        return data
+
+
+class NodeStream:
+    """Lazy, re-iterable view of a file's 'nodes' array.
+
+    Each iteration re-opens the file and yields one node array at a time
+    via ijson, so walking a file never holds more than one node.  With a
+    hasher, an iteration also feeds the whole file to it; iterate once.
+    """
+
+    def __init__(self, path: Path, hasher=None) -> None:
+        self.path = path
+        self.hasher = hasher
+
+    def __iter__(self):
+        with open(self.path, "rb") as f:
+            if self.hasher is None:
+                yield from ijson.items(f, "nodes.item", use_float=True)
+                return
+            reader = HashingReader(f, self.hasher)
+            yield from ijson.items(reader, "nodes.item", use_float=True)
+            while reader.read(HASH_CHUNK_SIZE):
+                pass  # hash anything the parser left unread
+
+
+def _consume_value(events, event: str, value, builder=None) -> None:
+    """Pull one complete JSON value off an ijson event stream.
+
+    (event, value) is the value's first event.  When builder is given, every
+    event is fed to it; otherwise the value is skipped.
+    """
+    depth = 0
+    while True:
+        if builder is not None:
+            builder.event(event, value)
+        if event in ("start_map", "start_array"):
+            depth += 1
+        elif event in ("end_map", "end_array"):
+            depth -= 1
+        if depth == 0:
+            return
+        _, event, value = next(events)
+
+
+def read_header(path: Path, hasher=None, check_syntax: bool = True) -> object:
+    """Parse a JSON file's top level without materializing 'nodes'.
+
+    Top-level values are built normally, except that a 'nodes' array is
+    replaced by a NodeStream (given hasher, if any).  With check_syntax,
+    the whole file is run through the parser (node events are skipped
+    without building objects), so syntax errors raise here rather than
+    midway through the nodes.  Without it, parsing stops once both
+    'nodeFormat' and 'nodes' have been seen and later errors surface when
+    the NodeStream is walked.  A top level that is not an object is always
+    parsed to the end, so a broken file raises rather than passing as a
+    wrong-typed value.  Requires ijson.
+    """
+    with open(path, "rb") as f:
+        events = ijson.parse(f, use_float=True)
+        _, event, value = next(events)
+        if event != "start_map":
+            deque(events, maxlen=0)  # syntax errors outrank the wrong type
+            return value  # not an object; the caller's validation reports it
+
+        header: dict = {}
+        for _, event, key in events:
+            if event == "end_map":
+                break
+            _, event, value = next(events)
+            if key == "nodes" and event == "start_array":
+                header["nodes"] = NodeStream(path, hasher)
+                if not check_syntax and "nodeFormat" in header:
+                    return header
+                _consume_value(events, event, value)
+                continue
+            builder = ijson.ObjectBuilder()
+            _consume_value(events, event, value, builder)
+            header[key] = builder.value
+        if check_syntax:
+            deque(events, maxlen=0)  # rejects trailing garbage
+    return header
+
+
+def list_json_files(directory: Path) -> list[Path]:
+    """Return the *.json files in a directory, sorted by name.
+
+    Uses os.scandir, whose entries carry the file type from the directory
+    listing, so no per-file stat is needed.  Names are matched like
+    Path.glob("*.json"), i.e. case-insensitively on Windows.  Directories
+    named *.json are skipped.
+    """
+    with os.scandir(directory) as entries:
+        paths = sorted(
+            entry.path for entry in entries
+            if fnmatch(entry.name, "*.json") and entry.is_file()
+        )
+    return list(map(Path, paths))
+
+
+def parallel_map(fn, items: list, jobs: int):
+    """Yield fn(item) for each item, in order, across up to `jobs` processes.
+
+    Runs in-process when there is only one job or one item, so small
+    batches don't pay the pool start-up cost.
+    """
+    workers = min(jobs, len(items))
+    if workers <= 1:
+        yield from map(fn, items)
+        return
+    chunksize = max(1, len(items) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        yield from ex.map(fn, items, chunksize=chunksize)
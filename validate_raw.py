@@ -21,8 +21,19 @@ Usage examples:
     # Strict mode: exit 1 on any warning (useful for CI / scripting)
     python validate_raw.py --raw_dir ./raw --strict
 
+    # Parse and validate files across 4 worker processes (default: one per CPU)
+    python validate_raw.py --raw_dir ./raw --jobs 4
+
     # Delete orphans automatically
     python validate_raw.py --raw_dir ./raw --output_dir ./output --delete-orphans
+
+    # Reuse content hashes from the previous run for unchanged files
+    python validate_raw.py --raw_dir ./raw --cache
+
+Optional dependencies:
+    pip install ijson     # streams nodes instead of loading whole files
+    pip install orjson    # faster whole-file parsing when ijson is absent
+    pip install blake3    # faster content hashing
 """
 
 from __future__ import annotations
@@ -30,40 +41,147 @@ from __future__ import annotations
 import argparse
 import hashlib
 import json
+import os
 import re
 import sys
+from collections import Counter, defaultdict
+from fnmatch import fnmatch
+from operator import itemgetter
 from pathlib import Path
 
+from tomtom_common import PARSE_ERRORS, NodeStream, parallel_map, read_header
+
+try:
+    import blake3
+except ImportError:  # optional dependency
+    blake3 = None
+
+try:
+    import ijson
+except ImportError:  # optional dependency
+    ijson = None
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
 # Expected naming pattern: {numeric_id}_{incoming|outgoing}_{x}_{y}.json
+# ASCII digits only; case folding is scoped to the direction and extension
+# rather than applied to the whole pattern, which keeps matching fast.
 FILENAME_RE = re.compile(
-    r"^(?P<device>\d+)_(?P<direction>incoming|outgoing)_(?P<x>\d+)_(?P<y>\d+)\.json$",
-    re.IGNORECASE,
+    r"^(?P<device>[0-9]+)_(?P<direction>(?i:incoming|outgoing))"
+    r"_(?P<x>[0-9]+)_(?P<y>[0-9]+)\.(?i:json)$",
+    re.ASCII,
 )
 
 EXPECTED_FIELDS = ["id", "parentid", "trips", "frc", "geometry",
                    "processingfailures", "privacytrims"]
 
+# Sidecar hash cache written to raw_dir with --cache.  Deliberately not
+# named *.json, so neither this script nor the pipeline picks it up as input.
+HASH_CACHE_NAME = ".validate_raw_cache"
+
+# Content hash used for duplicate detection.  Only accidental collisions
+# matter here, so the faster BLAKE3 is used when installed.
+HASH_NAME = "sha256" if blake3 is None else "blake3"
+# Same-size files larger than this are first compared on a hash of their
+# first HEAD_HASH_SIZE bytes; only files sharing that prefix get a full hash.
+HEAD_HASH_SIZE = 4096
+
 
 def parse_filename(name: str) -> dict | None:
     """Parse a filename into its components. Returns None if it doesn't match."""
     m = FILENAME_RE.match(name)
-    if not m:
+    if m is None:
         return None
-    return {
-        "device": m.group("device"),
-        "direction": m.group("direction").lower(),
-        "x": m.group("x"),
-        "y": m.group("y"),
-    }
+    device, direction, x, y = m.groups()
+    return {"device": device, "direction": direction.lower(), "x": x, "y": y}
+
 
+def new_hasher():
+    """Return a fresh HASH_NAME hash object."""
+    if blake3 is not None:
+        return blake3.blake3()
+    return hashlib.sha256()
 
-def file_hash(path: Path) -> str:
-    """Return SHA-256 hex digest of a file's contents."""
-    h = hashlib.sha256()
+
+def file_head_hash(path: Path, size: int = HEAD_HASH_SIZE) -> str:
+    """Return the HASH_NAME hex digest of the first `size` bytes of a file."""
+    hasher = new_hasher()
     with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(8192), b""):
-            h.update(chunk)
-    return h.hexdigest()
+        hasher.update(f.read(size))
+    return hasher.hexdigest()
+
+
+def load_hash_cache(raw_dir: Path) -> dict[str, dict]:
+    """Read the sidecar hash cache; a missing or unreadable cache is empty."""
+    try:
+        with open(raw_dir / HASH_CACHE_NAME, encoding="utf-8") as f:
+            cache = json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def _cached_digest(entry: object, st: os.stat_result) -> str | None:
+    """Return the cached digest if the entry matches the file's size and mtime.
+
+    Digests are stored under HASH_NAME, so a cache written with another
+    hash algorithm yields no hits.
+    """
+    if (isinstance(entry, dict) and entry.get("size") == st.st_size
+            and entry.get("mtime_ns") == st.st_mtime_ns):
+        return entry.get(HASH_NAME)
+    return None
+
+
+def save_hash_cache(raw_dir: Path, cache: dict[str, dict]) -> None:
+    """Write the sidecar hash cache atomically (temp file + rename)."""
+    path = raw_dir / HASH_CACHE_NAME
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cache, f)
+    tmp.replace(path)
+
+
+def parse_json(data: bytes) -> object:
+    """Parse UTF-8 JSON bytes.
+
+    Uses orjson when available, stdlib json otherwise.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data.decode("utf-8"))
+
+
+def load_doc(path: Path) -> object:
+    """Load a raw file for validation.
+
+    With ijson installed, only the header is parsed up front and 'nodes' is
+    streamed from disk by validate_structure, which also catches any syntax
+    errors, so the header pass skips its own syntax check; otherwise the
+    file is read whole.
+    """
+    if ijson is not None:
+        return read_header(path, check_syntax=False)
+    return parse_json(path.read_bytes())
+
+
+def load_hashed(path: Path) -> tuple[object, object]:
+    """Load a raw file like load_doc while hashing its contents.
+
+    Returns (doc, hasher).  With ijson, the file is hashed through a
+    HashingReader as its NodeStream is iterated, so the digest is only
+    complete once the nodes have been walked (as validate_structure does
+    for a valid file); otherwise the bytes read for parsing are hashed.
+    """
+    hasher = new_hasher()
+    if ijson is not None:
+        return read_header(path, hasher, check_syntax=False), hasher
+    data = path.read_bytes()
+    hasher.update(data)
+    return parse_json(data), hasher
 
 
 def validate_structure(doc: object, path: Path) -> str | None:
@@ -80,7 +198,7 @@ def validate_structure(doc: object, path: Path) -> str | None:
     nf = doc["nodeFormat"]
     if not isinstance(nf, list):
         return f"{path.name}: 'nodeFormat' is not an array"
-    if not isinstance(doc["nodes"], list):
+    if not isinstance(doc["nodes"], (list, NodeStream)):
         return f"{path.name}: 'nodes' is not an array"
     lower = [f.lower() if isinstance(f, str) else f for f in nf]
     if lower != EXPECTED_FIELDS:
@@ -89,7 +207,14 @@ def validate_structure(doc: object, path: Path) -> str | None:
             f"(got {nf})"
         )
     expected_len = len(nf)
-    for i, node in enumerate(doc["nodes"]):
+    nodes = doc["nodes"]
+    # Fast accept for in-memory node lists: both checks run as C-level
+    # map/count loops.  Only a failing file is walked to find the bad node.
+    if (isinstance(nodes, list)
+            and list(map(type, nodes)).count(list) == len(nodes)
+            and list(map(len, nodes)).count(expected_len) == len(nodes)):
+        return None
+    for i, node in enumerate(nodes):
         if not isinstance(node, list):
             return f"{path.name}: node[{i}] is not an array"
         if len(node) != expected_len:
@@ -100,13 +225,66 @@ def validate_structure(doc: object, path: Path) -> str | None:
     return None
 
 
+def check_file(task: tuple[Path, bool]) -> tuple[str | None, str | None, str | None]:
+    """Parse and structurally validate one raw file (Pass 1 worker).
+
+    task is (path, want_hash); with want_hash the file is read once and the
+    same bytes are hashed and parsed.  Returns (problem, message, digest),
+    where problem is None, "bad_json" or "bad_structure".  Runs in worker
+    processes, so failures are returned rather than recorded.
+    """
+    fp, want_hash = task
+    hasher = None
+    # With ijson, nodes are parsed while validate_structure walks them,
+    # so syntax errors can surface there too.
+    try:
+        if want_hash:
+            doc, hasher = load_hashed(fp)
+        else:
+            doc = load_doc(fp)
+        err = validate_structure(doc, fp)
+    except PARSE_ERRORS as exc:
+        return "bad_json", f"{fp.name}: cannot read/parse — {exc}", None
+    if err is not None:
+        return "bad_structure", err, None
+    return None, None, hasher.hexdigest() if hasher is not None else None
+
+
+def scan_json_files(directory: Path) -> list[tuple[str, Path, os.stat_result | None]]:
+    """Return (name, path, stat) for the *.json files in a directory, sorted by name.
+
+    A single os.scandir walk supplies names and file types from the
+    directory listing and stats via DirEntry.stat() (free on Windows).
+    stat is None for a file that cannot be stat'ed.  Names are matched
+    like Path.glob("*.json"), i.e. case-insensitively on Windows.
+    Directories named *.json are skipped.
+    """
+    found = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if fnmatch(entry.name, "*.json") and entry.is_file():
+                try:
+                    st = entry.stat()
+                except OSError:
+                    st = None  # reported as unreadable in Pass 1
+                found.append((entry.name, entry.path, st))
+    found.sort(key=itemgetter(0))
+    return [(name, Path(path), st) for name, path, st in found]
+
+
 def validate_raw(
     raw_dir: Path,
     output_dir: Path | None = None,
     delete_orphans: bool = False,
+    use_cache: bool = False,
+    jobs: int = 1,
 ) -> tuple[list[str], list[str], dict]:
     """Run all validation checks on raw_dir.
 
+    With use_cache, content hashes are reused from (and saved to) the
+    HASH_CACHE_NAME sidecar for files whose size and mtime are unchanged.
+    With jobs > 1, files are parsed and validated in that many processes.
+
     Returns (errors, warnings, stats) where:
       - errors:   issues that would corrupt the pipeline output
       - warnings: non-critical issues worth noting
@@ -126,84 +304,148 @@ def validate_raw(
         "orphans_deleted": 0,
     }
 
-    json_files = sorted(raw_dir.glob("*.json"))
-    stats["total_files"] = len(json_files)
+    scanned = scan_json_files(raw_dir)
+    stats["total_files"] = len(scanned)
 
-    if not json_files:
+    if not scanned:
         warnings.append(f"No *.json files found in {raw_dir}")
         return errors, warnings, stats
 
+    # Files of different sizes cannot be identical, so only files sharing
+    # a size with another file need a content hash.  Those are read once
+    # in Pass 1 and the same bytes are both hashed and parsed.
+    file_stats = {fp: st for _, fp, st in scanned if st is not None}
+    size_counts = Counter(st.st_size for st in file_stats.values())
+    cache = load_hash_cache(raw_dir) if use_cache else {}
+    # Cache hits cost nothing.  Larger same-size files without one are
+    # split further on a hash of their first bytes, which is far cheaper
+    # than hashing the whole file.  A head is only unique if no cached
+    # file shares its size, since cached files are never head-hashed.
+    digests: dict[Path, str] = {}
+    cached_sizes: set[int] = set()
+    head_keys: dict[Path, tuple[int, str]] = {}
+    for name, fp, st in scanned:
+        if st is None or size_counts[st.st_size] < 2:
+            continue
+        digest = _cached_digest(cache.get(name), st)
+        if digest is not None:
+            digests[fp] = digest
+            cached_sizes.add(st.st_size)
+        elif st.st_size > HEAD_HASH_SIZE:
+            try:
+                head_keys[fp] = (st.st_size, file_head_hash(fp))
+            except OSError:
+                pass  # reported as unreadable in Pass 1
+    head_counts = Counter(head_keys.values())
+
     # ── Pass 1: pattern check + JSON readability + structure ─────────
     valid_files: list[Path] = []
     parsed_names: dict[Path, dict] = {}
 
-    for fp in json_files:
-        parts = parse_filename(fp.name)
+    tasks: list[tuple[Path, bool]] = []
+    raw_names: set[str] = set()  # for the orphan check in Pass 4
+    for name, fp, st in scanned:
+        raw_names.add(name)
+        parts = parse_filename(name)
         if parts is None:
             warnings.append(
-                f"{fp.name}: filename does not match expected pattern "
+                f"{name}: filename does not match expected pattern "
                 f"{{deviceId}}_{{direction}}_{{x}}_{{y}}.json"
             )
             stats["bad_pattern"] += 1
+        else:
+            parsed_names[fp] = parts
 
-        try:
-            with open(fp, encoding="utf-8") as f:
-                doc = json.load(f)
-        except (json.JSONDecodeError, OSError) as exc:
-            errors.append(f"{fp.name}: cannot read/parse — {exc}")
-            stats["bad_json"] += 1
-            continue
-
-        err = validate_structure(doc, fp)
-        if err is not None:
-            errors.append(err)
-            stats["bad_structure"] += 1
+        head_key = head_keys.get(fp)
+        want_hash = (
+            st is not None and size_counts[st.st_size] > 1 and fp not in digests
+            and (head_key is None or head_counts[head_key] > 1
+                 or st.st_size in cached_sizes)
+        )
+        tasks.append((fp, want_hash))
+
+    for (fp, _), (problem, message, digest) in zip(
+        tasks, parallel_map(check_file, tasks, jobs)
+    ):
+        if problem is not None:
+            errors.append(message)
+            stats[problem] += 1
+            parsed_names.pop(fp, None)
+            digests.pop(fp, None)
             continue
-
         valid_files.append(fp)
-        if parts is not None:
-            parsed_names[fp] = parts
+        if digest is not None:
+            digests[fp] = digest
 
     stats["valid_files"] = len(valid_files)
 
     # ── Pass 2: content-hash duplicates ──────────────────────────────
-    hashes: dict[str, list[Path]] = {}
+    # Grouped in valid_files order: digests holds cache hits ahead of
+    # freshly computed hashes.  Most digests are unique, so each maps to
+    # its first file only; a group list is built just for duplicates.
+    first_seen: dict[str, Path] = {}
+    dupe_groups: dict[str, list[Path]] = {}
     for fp in valid_files:
-        h = file_hash(fp)
-        hashes.setdefault(h, []).append(fp)
-
-    for h, paths in hashes.items():
-        if len(paths) > 1:
-            names = ", ".join(p.name for p in paths)
-            errors.append(
-                f"Content-hash duplicate: the following files are identical: {names}"
-            )
-            stats["hash_dupes"] += len(paths) - 1
+        digest = digests.get(fp)
+        if digest is None:
+            continue
+        first = first_seen.setdefault(digest, fp)
+        if first is not fp:
+            dupe_groups.setdefault(digest, [first]).append(fp)
+
+    if use_cache:
+        # Rewrite the cache with fresh entries for files still present only
+        new_cache: dict[str, dict] = {}
+        for fp in valid_files:
+            st = file_stats[fp]
+            digest = digests.get(fp) or _cached_digest(cache.get(fp.name), st)
+            if digest is not None:
+                new_cache[fp.name] = {
+                    "size": st.st_size, "mtime_ns": st.st_mtime_ns, HASH_NAME: digest,
+                }
+        try:
+            save_hash_cache(raw_dir, new_cache)
+        except OSError as exc:
+            warnings.append(f"Cannot write hash cache in {raw_dir}: {exc}")
+
+    # Reported in order of each group's first file, as valid_files is sorted
+    for paths in sorted(dupe_groups.values()):
+        names = ", ".join(p.name for p in paths)
+        errors.append(
+            f"Content-hash duplicate: the following files are identical: {names}"
+        )
+        stats["hash_dupes"] += len(paths) - 1
 
     # ── Pass 3: slot collisions (same device+dir+x+y, different content) ─
-    slots: dict[str, list[Path]] = {}
+    # Keyed by tuple; the key is only formatted for an actual collision
+    slots: defaultdict[tuple[str, ...], list[Path]] = defaultdict(list)
     for fp, parts in parsed_names.items():
-        slot_key = f"{parts['device']}_{parts['direction']}_{parts['x']}_{parts['y']}"
-        slots.setdefault(slot_key, []).append(fp)
+        slot_key = (parts["device"], parts["direction"], parts["x"], parts["y"])
+        slots[slot_key].append(fp)
 
     for key, paths in slots.items():
         if len(paths) > 1:
             names = ", ".join(p.name for p in paths)
             errors.append(
-                f"Slot collision for [{key}]: {names}"
+                f"Slot collision for [{'_'.join(key)}]: {names}"
             )
             stats["slot_collisions"] += len(paths) - 1
 
     # ── Pass 4: orphan detection in output_dir ───────────────────────
     if output_dir is not None and output_dir.is_dir():
-        raw_names = {fp.name for fp in json_files}
-        for out_fp in sorted(output_dir.glob("*.json")):
-            if out_fp.name not in raw_names:
-                warnings.append(f"Orphan in {output_dir.name}/: {out_fp.name}")
-                stats["orphans"] += 1
-                if delete_orphans:
-                    out_fp.unlink()
-                    stats["orphans_deleted"] += 1
+        # Only names are needed, so the listing never builds Path objects
+        with os.scandir(output_dir) as entries:
+            orphans = sorted(
+                entry.name for entry in entries
+                if fnmatch(entry.name, "*.json") and entry.name not in raw_names
+                and entry.is_file()
+            )
+        for name in orphans:
+            warnings.append(f"Orphan in {output_dir.name}/: {name}")
+            stats["orphans"] += 1
+            if delete_orphans:
+                os.unlink(output_dir / name)
+                stats["orphans_deleted"] += 1
 
     return errors, warnings, stats
 
@@ -228,15 +470,29 @@ def main(argv: list[str] | None = None) -> int:
         "--delete-orphans", action="store_true",
         help="Delete orphan files from output_dir.",
     )
+    parser.add_argument(
+        "--jobs", type=int, default=os.cpu_count() or 1,
+        help="Worker processes for parsing and validating files "
+             "(default: CPU count).",
+    )
+    parser.add_argument(
+        "--cache", action=argparse.BooleanOptionalAction, default=False,
+        help=f"Reuse content hashes of unchanged files from {HASH_CACHE_NAME} "
+             "in raw_dir, and update it (default: off).",
+    )
     args = parser.parse_args(argv)
 
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1.")
+
     raw_dir: Path = args.raw_dir
     if not raw_dir.is_dir():
         print(f"Error: directory not found: {raw_dir}", file=sys.stderr)
         return 1
 
     errors, warnings, stats = validate_raw(
-        raw_dir, args.output_dir, args.delete_orphans
+        raw_dir, args.output_dir, args.delete_orphans, use_cache=args.cache,
+        jobs=args.jobs,
     )
 
     # ── Report ───────────────────────────────────────────────────────